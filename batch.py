@@ -0,0 +1,112 @@
+
+# coding: utf-8
+
+# Vectorized engine running N independent matches at once.
+# Ship state lives in (N, players, 2) arrays and bullet state in (N, bullets, 2)
+# arrays, each player owning a block of MAX_BULLETS+1 bullet slots. Every tick
+# runs the physics.py kernels Human.update uses on all ships of all matches
+# at once, and Bullet.update as NumPy expressions. Collisions are not
+# simulated here.
+
+
+import numpy as np
+import main
+import physics
+
+
+class BatchSim():
+    def __init__(self,n,players=main.MAX_PLAYERS,w=main.HEADLESS_W,h=main.HEADLESS_H,frames=60,seed=None):
+        self.n=n
+        self.players=players
+        self.size=self.width,self.height=w,h
+        self.dt=1/frames
+        self.rng=np.random.default_rng(seed)
+
+        self.MAX_SPEED=h*main.MAX_SPEED_R
+        self.THRUST_V=self.MAX_SPEED/main.DRAG_TIME
+        self.BULLET_VEL=h*main.BULLET_VEL_R
+        self.bound=np.array([w+1.0,h+1.0])
+        self.slots=main.MAX_BULLETS+1
+
+        self.ticks=0
+        self.sim_time=0.0
+
+        self.pos=np.zeros((n,players,2))
+        self.vel=np.zeros((n,players,2))
+        self.angle=np.zeros((n,players))
+        self.rot=np.zeros((n,players))
+        self.thrust=np.zeros((n,players))
+        self.fire=np.zeros((n,players),dtype=bool)
+        self.hp=np.zeros((n,players),dtype=np.int64)
+        self.collide=np.zeros((n,players),dtype=bool)
+        self.last_fire=np.zeros((n,players))
+        self.collisiontime=np.zeros((n,players))
+        self.t0=np.zeros(n)
+
+        self.bullet_pos=np.zeros((n,players*self.slots,2))
+        self.bullet_vel=np.zeros((n,players*self.slots,2))
+        self.bullet_alive=np.zeros((n,players*self.slots),dtype=bool)
+        self.bullet_owner=np.repeat(np.arange(players),self.slots)[None,:].repeat(n,axis=0)
+
+        self.reset()
+
+    def reset(self,matches=None):
+        # respawns every ship of the selected matches, as Human.on_init does
+        if matches is None:
+            matches=np.ones(self.n,dtype=bool)
+        idx=np.flatnonzero(matches)
+        k=len(idx)
+        draws=self.rng.random((k,self.players,3))
+        self.pos[idx,:,0]=draws[...,0]*self.width*(1-2*main.GAME_W_R)+main.GAME_W_R*self.width
+        self.pos[idx,:,1]=draws[...,1]*self.height*(1-2*main.GAME_H_R)+main.GAME_H_R*self.height
+        self.pos[idx]=np.remainder(self.pos[idx],self.bound)
+        self.angle[idx]=draws[...,2]*(2*np.pi)
+        self.vel[idx]=0
+        self.rot[idx]=0
+        self.thrust[idx]=0
+        self.fire[idx]=False
+        self.hp[idx]=main.HP
+        self.collide[idx]=False
+        self.last_fire[idx]=self.sim_time
+        self.collisiontime[idx]=self.sim_time
+        self.t0[idx]=self.sim_time
+        self.bullet_alive[idx]=False
+
+    def set_actions(self,actions):
+        # actions: (N, players, 3) rows of (rot, thrust, fire), see Human.set_action
+        actions=np.asarray(actions)
+        self.rot[...]=actions[...,0]*main.OMEGA
+        self.thrust[...]=np.where(actions[...,1]>0,self.THRUST_V,np.where(actions[...,1]<0,-main.BREAK*self.THRUST_V,0))
+        self.fire[...]=actions[...,2]!=0
+
+    def step(self):
+        self.ticks+=1
+        self.sim_time=self.ticks*self.dt
+        dt=self.dt
+
+        #SHIPS
+        k=self.n*self.players
+        physics.integrate(self.pos.reshape((k,2)),self.vel.reshape((k,2)),self.angle.reshape(k),self.rot.reshape(k),self.thrust.reshape(k),
+                          dt,self.MAX_SPEED,main.DRAG_TIME,self.bound)
+
+        #FIRING
+        alive=self.bullet_alive.reshape((self.n,self.players,self.slots))
+        free=np.argmin(alive,axis=2)
+        shoot=self.fire&self.collide&(self.sim_time-self.last_fire>=1./main.RATE_OF_FIRE)&~alive.all(axis=2)
+        match,player=np.nonzero(shoot)
+        if len(match):
+            slot=player*self.slots+free[match,player]
+            bvel,vel=physics.launch_all(self.vel[match,player],self.angle[match,player],self.BULLET_VEL,main.MASS_RATIO)
+            self.bullet_pos[match,slot]=self.pos[match,player]
+            self.bullet_vel[match,slot]=bvel
+            self.bullet_alive[match,slot]=True
+            self.vel[match,player]=vel
+            self.last_fire[match,player]=self.sim_time
+
+        self.collide=(self.sim_time-self.t0[:,None]>main.INIT_COOLDOWN)&(self.sim_time-self.collisiontime>main.COOLDOWN)
+
+        #BULLETS
+        self.bullet_pos+=dt*self.bullet_vel
+        x=self.bullet_pos[...,0]
+        y=self.bullet_pos[...,1]
+        self.bullet_alive&=~((x>self.width)|(x<0)|(y>self.height)|(y<0))
@@ -0,0 +1,239 @@
+
+# coding: utf-8
+
+# Micro benchmarks of the hot functions and end to end throughput.
+# Usage: python bench.py [ticks] [--json results.json] [--compare baseline.json]
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+import pygame
+import main
+import physics
+import vecenv
+
+
+BENCH_W=1280
+BENCH_H=720
+BENCH_TICKS=2000
+BENCH_CALLS=2000 # calls per micro benchmark run
+BENCH_WARMUP=300 # heavy fire ticks before the micro benchmarks, past INIT_COOLDOWN so bullets are flying
+BENCH_TOLERANCE=0.1 # relative slowdown reported as a regression
+BENCH_ARENAS=(8,16,64) # ships per arena in the scaling benchmark
+BENCH_KERNEL_SHIPS=1024 # ships per physics.integrate call
+
+
+def heavy_fire(App):
+    # every ship spins, thrusts and fires continuously
+    for agent in App.agents:
+        agent.rot=main.OMEGA
+        agent.thrust=agent.THRUST_V
+        agent.fire=True
+
+
+def ticks_per_sec(headless,ticks=BENCH_TICKS,w=BENCH_W,h=BENCH_H,players=main.MAX_PLAYERS,swept=False):
+    if not headless:
+        # a dummy driver still does every blit and flip, just without a window
+        os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+    App=main.App(w,h,headless=headless,n_players=players,swept=swept)
+    App.on_init()
+    App.fps=0 # uncapped frame rate, dt is left untouched
+    start=time.perf_counter()
+    for n in range(ticks):
+        heavy_fire(App)
+        App.on_loop()
+        if not headless:
+            App.on_render()
+    elapsed=time.perf_counter()-start
+    App.on_cleanup()
+    return ticks/elapsed
+
+
+def scale_explosion(App,scale,n):
+    # one frame scaled on its own, what App.explosion_frame saves
+    return pygame.transform.smoothscale(App.effects.frame(main.EXPLOSION_IMG.format(n+1)),App.explosion_size(scale)).convert_alpha()
+
+
+def impacts_ticks_per_sec(impacts,ticks=BENCH_TICKS//4,cached=True,w=BENCH_W,h=BENCH_H):
+    # many simultaneous impacts, cached=False smoothscales every frame load on its own
+    os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+    App=main.App(w,h)
+    App.on_init()
+    if not cached:
+        App.explosion_frame=lambda scale,n: scale_explosion(App,scale,n)
+    agents=App.agents.sprites()
+    elapsed=0.0
+    for n in range(ticks):
+        if not App.explosions:
+            for i in range(impacts):
+                main.Impact(App,agents[0],agents[1],App.explosions,App.all_sprites)
+        start=time.perf_counter()
+        App.explosions.update(App)
+        elapsed+=time.perf_counter()-start
+    App.on_cleanup()
+    return ticks/elapsed
+
+
+def vec_steps_per_sec(k,steps=BENCH_TICKS//4,w=BENCH_W,h=BENCH_H):
+    with vecenv.SubprocVecEnv(k,w=w,h=h) as venv:
+        venv.reset()
+        actions=np.ones((k,venv.n_players,3),dtype=np.int8)
+        start=time.perf_counter()
+        for n in range(steps):
+            venv.step(actions)
+        elapsed=time.perf_counter()-start
+    return k*steps/elapsed
+
+
+def per_call(fn,calls=BENCH_CALLS):
+    # microseconds per call, best of three runs
+    best=None
+    for run in range(3):
+        start=time.perf_counter()
+        for n in range(calls):
+            fn(n)
+        elapsed=(time.perf_counter()-start)/calls*1e6
+        if best is None or elapsed<best:
+            best=elapsed
+    return best
+
+
+def micro(calls=BENCH_CALLS,w=BENCH_W,h=BENCH_H):
+    # per function costs in one dummy windowed match, mid heavy fire
+    os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+    App=main.App(w,h,seed=0)
+    App.on_init()
+    for n in range(BENCH_WARMUP):
+        heavy_fire(App)
+        App.on_loop()
+    state=App.get_state()
+    agents=App.agents.sprites()
+    bullet=next(iter(App.bullet_group))
+    explosion=main.Explosion(App,agents[0],App.explosions)
+    results={}
+
+    def update(n):
+        agents[0].update(App)
+    results['Human.update']=per_call(update,calls)
+    App.set_state(state)
+
+    def rotate(n):
+        agents[0].rotate(n*0.01,('ship',0))
+    results['Human.rotate']=per_call(rotate,calls)
+
+    def collisionvels(n):
+        main.collisionvels(agents[0],agents[1],App)
+    results['collisionvels']=per_call(collisionvels,calls)
+    App.set_state(state)
+
+    def bullet_update(n):
+        App.bulletpool.update(App)
+        App.set_state(state)
+    results['BulletPool.update+set_state']=per_call(bullet_update,calls//10)
+    results['App.set_state']=per_call(lambda n:App.set_state(state),calls//10)
+    results['BulletPool.update']=results.pop('BulletPool.update+set_state')-results['App.set_state']
+    results['Bullet.move']=per_call(lambda n:bullet.move(),calls)
+    results['BulletHitPlayer']=per_call(lambda n:App.BulletHitPlayer(),calls)
+    App.set_state(state)
+    results['PlayerHitPlayer']=per_call(lambda n:App.PlayerHitPlayer(),calls)
+    App.set_state(state)
+
+    def explosion_load(n):
+        explosion.frame=n%main.EXPLOSION_FRAMES
+        explosion.load(App)
+    results['Explosion.load']=per_call(explosion_load,calls)
+    results['GlyphLabel.render']=per_call(lambda n:App.label_time.render('{:.1f}'.format(n*0.1)),calls)
+    results['App.draw_hud']=per_call(lambda n:App.draw_hud(),calls)
+    results['App.get_state']=per_call(lambda n:App.get_state(),calls)
+    App.on_cleanup()
+
+    k=BENCH_KERNEL_SHIPS
+    rng=np.random.default_rng(0)
+    pos=rng.random((k,2))*(w,h)
+    vel=np.zeros((k,2))
+    angle=rng.random(k)*2*np.pi
+    rot=rng.integers(-1,2,k)*main.OMEGA
+    thrust=np.full(k,h*main.MAX_SPEED_R/main.DRAG_TIME)
+    bound=np.array([w+1.0,h+1.0])
+    def integrate(n):
+        physics.integrate(pos,vel,angle,rot,thrust,1/60,h*main.MAX_SPEED_R,main.DRAG_TIME,bound)
+    integrate(0)
+    results['physics.integrate x{}'.format(k)]=per_call(integrate,calls)
+    return results
+
+
+def macro(ticks=BENCH_TICKS):
+    results={}
+    results['windowed ticks/s']=ticks_per_sec(False,ticks)
+    results['headless ticks/s']=ticks_per_sec(True,ticks)
+    results['swept headless ticks/s']=ticks_per_sec(True,ticks,swept=True)
+    for impacts in (10,100):
+        results['{} impacts uncached ticks/s'.format(impacts)]=impacts_ticks_per_sec(impacts,ticks//4,cached=False)
+        results['{} impacts ticks/s'.format(impacts)]=impacts_ticks_per_sec(impacts,ticks//4)
+    for players in BENCH_ARENAS:
+        # ship ticks/s stays flat while the cost per tick grows linearly with the ships
+        rate=ticks_per_sec(True,ticks//4,players=players)
+        results['{} ships headless ticks/s'.format(players)]=rate
+        results['{} ships ship ticks/s'.format(players)]=rate*players
+    k=1
+    while k<=os.cpu_count():
+        results['{} workers steps/s'.format(k)]=vec_steps_per_sec(k,ticks//4)
+        k*=2
+    return results
+
+
+def compare(results,baseline,tolerance=BENCH_TOLERANCE):
+    # per metric change against the baseline, rates should rise and microseconds fall
+    regressions=[]
+    for group in ('micro','macro'):
+        for name,value in results[group].items():
+            old=baseline.get(group,{}).get(name)
+            if old is None:
+                continue
+            if group=='micro':
+                change=old/value-1
+            else:
+                change=value/old-1
+            flag=''
+            if change<-tolerance:
+                flag=' REGRESSION'
+                regressions.append(name)
+            print('{:32s} {:12.2f} {:12.2f} {:+7.1%}{}'.format(name,old,value,change,flag))
+    return regressions
+
+
+if __name__ == "__main__" :
+    parser=argparse.ArgumentParser(description='Micro and end to end benchmarks.')
+    parser.add_argument('ticks',nargs='?',type=int,default=BENCH_TICKS)
+    parser.add_argument('--json',help='write the results to this file')
+    parser.add_argument('--compare',help='baseline JSON to compare against, exits 1 on regressions')
+    parser.add_argument('--tolerance',type=float,default=BENCH_TOLERANCE)
+    parser.add_argument('--micro-only',action='store_true')
+    args=parser.parse_args()
+
+    results={'platform':{'python':platform.python_version(),'numpy':np.__version__,'pygame':main.pygame.version.ver,
+                         'machine':platform.platform(),'cpus':os.cpu_count(),'numba':physics.JIT}}
+    results['micro']=micro()
+    results['macro']={} if args.micro_only else macro(args.ticks)
+    for group in ('micro','macro'):
+        unit='us' if group=='micro' else ''
+        for name,value in results[group].items():
+            print('{:32s} {:12.2f} {}'.format(name,value,unit))
+
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline=json.load(f)
+        print()
+        if compare(results,baseline,args.tolerance):
+            sys.exit(1)
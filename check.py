@@ -0,0 +1,164 @@
+# coding: utf-8
+
+# Determinism and physics checks: replays and snapshots reproduce a match bit for
+# bit, swept collisions keep aimed hits at low frame rates, and the compiled
+# physics.py kernels agree with the NumPy and plain Python ones.
+# Usage: python check.py [ticks]
+
+
+import os
+import sys
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER','dummy')
+os.environ.setdefault('SDL_AUDIODRIVER','dummy')
+
+import main
+import physics
+import replay
+import controllers
+
+
+CHECK_W=800
+CHECK_H=600
+CHECK_TICKS=3000
+CHECK_SNAPSHOTS=(500,1234,2500) # ticks where a snapshot is taken and resumed
+CHECK_OFFSETS=np.linspace(-40,40,41) # target offsets across the line of fire, in pixels
+CHECK_FRAMES=(5,3,2) # frame rates whose swept hits must match 60 fps
+CHECK_KERNEL_SHIPS=1000
+
+
+failures=[]
+
+
+def report(name,ok):
+    print('%-44s %s'%(name,'ok' if ok else 'FAILED'))
+    if not ok:
+        failures.append(name)
+
+
+def random_actions(ticks,players,seed):
+    rng=np.random.default_rng(seed)
+    actions=rng.integers(-1,2,(ticks,players,3))
+    actions[...,2]=rng.random((ticks,players))<0.7
+    return actions
+
+
+def play(App,actions,start,stop):
+    for t in range(start,stop):
+        for agent in App.agents:
+            agent.set_action(*actions[t,agent.number])
+        App.on_loop()
+
+
+def check_replay(ticks):
+    # a recorded match, played back headless, ends with the very same ships
+    for name,kwargs in (('external actions',{}),('bot controllers',{'controllers':controllers.bots(0)})):
+        App=main.App(CHECK_W,CHECK_H,headless=True,seed=7,**kwargs)
+        App.on_init()
+        recorder=replay.Recorder(App)
+        if kwargs:
+            for n in range(ticks):
+                App.on_loop()
+        else:
+            play(App,random_actions(ticks,App.n_players,3),0,ticks)
+        recorded=recorder.stop()
+        report('replay, '+name,np.array_equal(replay.ships(replay.fast_forward(recorded)),recorded.final))
+
+
+def check_snapshots(ticks):
+    # set_state into a fresh App with another seed, then both finish the match identically
+    actions=random_actions(ticks,main.MAX_PLAYERS,4)
+    App=main.App(CHECK_W,CHECK_H,headless=True,seed=11)
+    App.on_init()
+    snaps={}
+    for t in range(ticks):
+        if t in CHECK_SNAPSHOTS:
+            snaps[t]=App.get_state()
+        play(App,actions,t,t+1)
+    final=App.get_state()
+    for t,state in snaps.items():
+        other=main.App(CHECK_W,CHECK_H,headless=True,seed=99)
+        other.on_init()
+        other.set_state(state)
+        ok=np.array_equal(other.get_state(),state)
+        play(other,actions,t,ticks)
+        report('snapshot at tick %d'%t,ok and np.array_equal(other.get_state(),final))
+
+
+def aimed_hits(frames,swept):
+    # offsets at which a single shot across the screen damages a still target
+    hits=[]
+    for off in CHECK_OFFSETS:
+        App=main.App(1280,720,frames,headless=True,seed=0,swept=swept)
+        App.on_init()
+        App.t0=-10 # shields down
+        target,shooter=App.agents.sprites()
+        for ship,(x,y) in ((target,(640,360+off)),(shooter,(200,360))):
+            ship.body.x,ship.body.y,ship.body.vx,ship.body.vy=x,y,0.0,0.0
+        target.angle,shooter.angle=1.0,0.0
+        target.collisiontime=shooter.collisiontime=-10
+        target.set_action(0,0,0)
+        shooter.set_action(0,0,1)
+        while not len(shooter.bullets):
+            App.on_loop()
+        shooter.set_action(0,0,0)
+        for n in range(frames*2):
+            App.on_loop()
+        if target.hp<main.HP:
+            hits.append(off)
+    return hits
+
+
+def check_swept():
+    reference=aimed_hits(60,True)
+    report('swept, %d hits at 60 fps'%len(reference),len(reference)>0 and reference==aimed_hits(60,False))
+    for frames in CHECK_FRAMES:
+        report('swept, same hits at %d fps'%frames,aimed_hits(frames,True)==reference)
+
+
+def check_kernels():
+    # the array kernels in use against the NumPy ones, and the scalar kernels against their Python source
+    rng=np.random.default_rng(5)
+    n=CHECK_KERNEL_SHIPS
+    bound=np.array([CHECK_W+1.0,CHECK_H+1.0])
+    max_speed=CHECK_H*main.MAX_SPEED_R
+    pos=rng.random((n,2))*bound
+    vel=(rng.random((n,2))-0.5)*3*max_speed
+    angle=rng.random(n)*2*np.pi
+    rot=rng.integers(-1,2,n)*main.OMEGA
+    thrust=rng.integers(0,2,n)*max_speed/main.DRAG_TIME
+    state=[pos,vel,angle]
+    other=[a.copy() for a in state]
+    for t in range(100):
+        physics.integrate(*state,rot,thrust,1/60,max_speed,main.DRAG_TIME,bound)
+        physics.integrate_numpy(*other,rot,thrust,1/60,max_speed,main.DRAG_TIME,bound)
+    report('integrate, %s vs NumPy'%('numba' if physics.JIT else 'NumPy'),all(np.array_equal(a,b) for a,b in zip(state,other)))
+    speed=CHECK_H*main.BULLET_VEL_R
+    report('launch_all, %s vs NumPy'%('numba' if physics.JIT else 'NumPy'),
+           all(np.array_equal(a,b) for a,b in zip(physics.launch_all(vel,angle,speed,main.MASS_RATIO),
+                                                   physics.launch_all_numpy(vel,angle,speed,main.MASS_RATIO))))
+    if not physics.JIT:
+        print('numba is not installed, the compiled kernels were not checked')
+        return
+    ok=True
+    for i in range(n):
+        args=(pos[i,0],pos[i,1],vel[i,0],vel[i,1],angle[i],rot[i],thrust[i],1/60,max_speed,main.DRAG_TIME,bound[0],bound[1])
+        ok&=physics.advance(*args)==physics.advance.py_func(*args)
+        args=(vel[i,0],vel[i,1],angle[i],speed,main.MASS_RATIO)
+        ok&=physics.launch(*args)==physics.launch.py_func(*args)
+        j=(i+1)%n
+        args=(pos[i,0],pos[i,1],vel[i,0],vel[i,1],1.0,pos[j,0],pos[j,1],vel[j,0],vel[j,1],2.0,main.LOSS)
+        ok&=physics.bounce(*args)==physics.bounce.py_func(*args)
+    report('scalar kernels, numba vs Python',ok)
+
+
+if __name__ == "__main__" :
+    ticks=int(sys.argv[1]) if len(sys.argv)>1 else CHECK_TICKS
+    check_replay(ticks)
+    check_snapshots(ticks)
+    check_swept()
+    check_kernels()
+    if failures:
+        print('%d check(s) failed'%len(failures))
+        sys.exit(1)
@@ -0,0 +1,167 @@
+
+# coding: utf-8
+
+# Controllers beyond the keyboard: a scripted bot, replay playback and neural
+# policies. PolicyControllers sharing a BatchedPolicy are served by one policy
+# call per tick, optionally on a worker thread with a fixed action latency.
+# Usage: python controllers.py [players] plays player 1 on the keyboard against
+# one bot, or against players-1 bots in a free-for-all.
+
+
+import sys
+import math as m
+import threading
+import collections
+import numpy as np
+import main
+import observation
+
+
+#BOT PARAMETERS
+AIM_TOLERANCE=0.1 # rad off target the bot still fires at
+CHASE_DISTANCE_R=0.3 # the bot thrusts while farther than this, in screen heights
+
+
+class ChaseController(main.Controller):
+    # turns towards the nearest other ship, closes in and fires when aimed
+    def act(self,App,agent):
+        target=None
+        best=None
+        for other in App.agents:
+            if other is agent:
+                continue
+            dx=(other.body.x-agent.body.x+App.width/2.0)%(App.width+1.0)-App.width/2.0
+            dy=(other.body.y-agent.body.y+App.height/2.0)%(App.height+1.0)-App.height/2.0
+            d=m.hypot(dx,dy)
+            if best is None or d<best:
+                target=(dx,dy)
+                best=d
+        if target is None:
+            agent.set_action(0,0,0)
+            return
+        error=(m.atan2(-target[1],target[0])-agent.angle+m.pi)%(2*m.pi)-m.pi
+        rot=1 if error>AIM_TOLERANCE/2 else -1 if error<-AIM_TOLERANCE/2 else 0
+        thrust=1 if best>CHASE_DISTANCE_R*App.height and abs(error)<m.pi/2 else 0
+        agent.set_action(rot,thrust,abs(error)<AIM_TOLERANCE)
+
+
+def bots(humans=0,bot=ChaseController):
+    # App controllers for an arena: the first humans players keep their keyboard, every other gets a new bot
+    return lambda n:None if n<humans else bot()
+
+
+class ReplayController(main.Controller):
+    # plays one ship's recorded actions, then stands still
+    def __init__(self,replay,number):
+        self.actions=replay.actions[:,number]
+        self.tick=0
+
+    def act(self,App,agent):
+        if self.tick<len(self.actions):
+            agent.set_action(*self.actions[self.tick])
+        else:
+            agent.set_action(0,0,0)
+        self.tick+=1
+
+
+class BatchedPolicy():
+    # policy: callable mapping (ships, obs_size) float32 observations to (ships, 3) actions
+    # latency: ticks between an observation and the actions computed from it
+    # threaded: inference runs on a worker thread, the tick loop never waits for it
+    #           and ships keep their last actions until a result is due
+    def __init__(self,policy,App,latency=0,threaded=False,observer=None):
+        self.policy=policy
+        self.App=App
+        self.latency=latency
+        self.threaded=threaded
+        self.observer=observer
+        self.members=[]
+        self.actions={}
+        self.tick=None
+        self.match=0 # counts resets, results of an earlier match are dropped
+        self.results=collections.deque() # (due tick, numbers, actions), oldest first
+
+        if threaded:
+            self.request=None
+            self.ready=threading.Condition()
+            self.busy=False
+            self.closed=False
+            self.thread=threading.Thread(target=self.work,daemon=True)
+            self.thread.start()
+
+    def controller(self,number):
+        self.members.append(number)
+        self.actions[number]=(0,0,0)
+        return PolicyController(self)
+
+    def act(self,App,agent):
+        if App.ticks!=self.tick:
+            if self.tick is not None and App.ticks<self.tick:
+                self.new_match()
+            self.tick=App.ticks
+            self.step(App)
+        agent.set_action(*self.actions[agent.number])
+
+    def new_match(self):
+        # the clock went back, App.reset or set_state: forget the queued actions
+        self.match+=1
+        self.results.clear()
+        for number in self.members:
+            self.actions[number]=(0,0,0)
+        if self.threaded:
+            with self.ready:
+                self.request=None
+                self.busy=False # a new request may queue behind a running one
+
+    def step(self,App):
+        if self.observer is None:
+            self.observer=observation.ObservationBuilder(App)
+        if not self.threaded or not self.busy:
+            obs=self.observer.build()[self.members]
+            if self.threaded:
+                with self.ready:
+                    self.request=(self.match,App.ticks+self.latency,list(self.members),obs)
+                    self.busy=True
+                    self.ready.notify()
+            else:
+                self.results.append((App.ticks+self.latency,list(self.members),self.policy(obs)))
+        while self.results and self.results[0][0]<=App.ticks:
+            due,numbers,actions=self.results.popleft()
+            for number,action in zip(numbers,np.asarray(actions)):
+                self.actions[number]=tuple(int(a) for a in action)
+
+    def work(self):
+        while True:
+            with self.ready:
+                while self.request is None and not self.closed:
+                    self.ready.wait()
+                if self.closed:
+                    return
+                match,due,numbers,obs=self.request
+                self.request=None
+            actions=self.policy(obs)
+            with self.ready:
+                if match==self.match:
+                    self.results.append((due,numbers,actions))
+                self.busy=self.request is not None
+
+    def close(self):
+        if self.threaded:
+            with self.ready:
+                self.closed=True
+                self.ready.notify()
+            self.thread.join()
+
+
+class PolicyController(main.Controller):
+    def __init__(self,batch):
+        self.batch=batch
+
+    def act(self,App,agent):
+        self.batch.act(App,agent)
+
+
+if __name__ == "__main__" :
+    players=int(sys.argv[1]) if len(sys.argv)>1 else main.MAX_PLAYERS
+    with main.App(controllers=bots(1),n_players=players) as theApp:
+        theApp.on_execute()
@@ -0,0 +1,124 @@
+
+# coding: utf-8
+
+# Gym-style environment around App for reinforcement learning.
+# Actions are one row per player: (rot, thrust, fire) with rot and thrust
+# in {-1,0,1} and fire in {0,1}, see Human.set_action. Observations are
+# written into one buffer that is reused between steps.
+
+
+import numpy as np
+import pygame
+import main
+import observation
+import pixels
+import recorder
+
+
+#REWARD PARAMETERS
+SCORE_REWARD=1.0 # per round won, minus the opponents' mean
+HP_REWARD=0.1 # per hp point, minus the opponents' mean
+
+ACTION_SIZE=3
+
+
+class SpaceOutEnv():
+    def __init__(self,w=main.HEADLESS_W,h=main.HEADLESS_H,frames=60,frame_skip=1,max_steps=None,headless=True,
+                 k_bullets=observation.K_BULLETS,egocentric=True,wrap=True,
+                 pixel_obs=False,pixel_w=pixels.PIXEL_W,pixel_h=pixels.PIXEL_H,stack=pixels.STACK,seed=None,
+                 record=None,asset_cache=None,players=main.MAX_PLAYERS,swept=main.SWEPT):
+        # swept: keeps bullet hits the same at low frames, see App.crossings
+        self.App=main.App(w,h,frames,headless=headless,seed=seed,asset_cache=asset_cache,n_players=players,swept=swept)
+        self.frame_skip=frame_skip
+        self.max_steps=max_steps
+        self.n_players=players
+        self.started=False
+        self.steps=0
+
+        self.pixel_obs=pixel_obs
+        if pixel_obs:
+            # (stack, h, w) uint8 frames, the same for every player
+            self.observer=pixels.PixelObservation(self.App,pixel_w,pixel_h,stack)
+        else:
+            self.observer=observation.ObservationBuilder(self.App,self.n_players,k_bullets,egocentric,wrap)
+        self.obs=self.observer.obs
+
+        # record: directory for trajectory shards, see recorder.py
+        self.recorder=None
+        if record is not None:
+            self.recorder=recorder.TrajectoryRecorder(record,self.n_players,self.obs.shape,self.obs.dtype,ACTION_SIZE)
+        self.hp=np.zeros(self.n_players)
+        self.score=np.zeros(self.n_players)
+
+    def reset(self,seed=None):
+        # every match gets its own seed, drawn from the previous one when not given
+        if not self.started:
+            if seed is not None:
+                self.App.seed_match(seed)
+            self.App.on_init()
+            self.started=True
+        else:
+            self.App.reset(seed)
+        self.steps=0
+        if self.pixel_obs:
+            self.observer.reset()
+        self.hp,self.score=self.tally()
+        return self.observe()
+
+    def step(self,actions):
+        actions=np.asarray(actions).reshape((self.n_players,ACTION_SIZE))
+        if self.recorder is not None:
+            self.recorder.observe(self.obs)
+        for agent in self.App.agents:
+            agent.set_action(*actions[agent.number])
+
+        for n in range(self.frame_skip):
+            self.App.on_loop()
+            if self.round_over():
+                break
+        if not self.App.headless:
+            self.render()
+        self.steps+=1
+
+        hp,score=self.tally()
+        rewards=SCORE_REWARD*zerosum(score-self.score)+HP_REWARD*zerosum(hp-self.hp)
+        self.hp,self.score=hp,score
+
+        truncated=self.max_steps is not None and self.steps>=self.max_steps
+        dones=np.full(self.n_players,self.round_over() or truncated)
+        if self.recorder is not None:
+            self.recorder.act(actions,rewards,dones)
+        return self.observe(),rewards.astype(np.float32),dones,{'truncated':truncated}
+
+    def round_over(self):
+        for agent in self.App.agents:
+            if agent.dead:
+                return True
+        return False
+
+    def tally(self):
+        hp=np.zeros(self.n_players)
+        score=np.zeros(self.n_players)
+        for agent in self.App.agents:
+            hp[agent.number]=agent.hp
+            score[agent.number]=agent.score
+        return hp,score
+
+    def observe(self):
+        self.obs=self.observer.build()
+        return self.obs
+
+    def render(self):
+        pygame.event.pump()
+        self.App.on_render()
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
+        self.App.on_cleanup()
+
+
+def zerosum(delta):
+    if len(delta)<2:
+        return delta
+    return delta-(delta.sum()-delta)/(len(delta)-1)
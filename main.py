@@ -5,16 +5,38 @@
 
 
 import math as m
+import copy
 import inspect
 import time
+import json
+import hashlib
 import os
 import sys
 import numpy as np
 import pygame
 from pygame.locals import *
+import physics
 
 #GENERAL PARAMETERS
-MAX_PLAYERS=2
+MAX_PLAYERS=2 # ships in a default match
+PLAYER_LIMIT=64 # most ships one arena takes, see App(n_players=...)
+HEADLESS_W=1280 # simulation size when running headless without explicit size
+HEADLESS_H=720
+
+#ROTATION CACHE PARAMETERS
+ROT_BUCKETS=360 # quantized angles per turn for rotated sprites and masks, 0 rotates exactly every frame
+ROT_PRELOAD=True # rotate every bucket when a sprite is first registered, False rotates on first use
+
+#ASSET PARAMETERS
+ASSET_CACHE=None # directory caching scaled and rotated sprites between runs, None keeps them in memory only
+PLAYER_IMG='images/player{}.png'
+SHIELD_IMG='images/player{}_shield2.png'
+BULLET_IMG='images/bullets.png'
+FLAME_IMG='images/flame{}.png'
+SMOKE_IMG='images/smoke{}.png'
+EXPLOSION_IMG='images/explosion/{}.png'
+PLAYER_IMAGES=2 # ships with their own image files, the others reuse them hue shifted
+PLAYER_HUE_STEP=137 # degrees between the hues of successive generated ships
 
 
 #EMITTER PARAMETERS
@@ -42,6 +64,7 @@ BULLET_VEL_R=0.6 # bullet speed in ratio of screen height per sec in relation to
 
 
 # COLLISION RELATED PARAMETERS
+HP=3 # hit points per round
 INIT_COOLDOWN=3.0 # initial secs of non collision mode
 COOLDOWN=1.0 #secs of non collision mode after collision
 MASS_RATIO=1e-2 # m_bullet/m_ship
@@ -49,6 +72,7 @@ LOSS=0.9  # velocity loss in each collision
 EXPLOSION_TIME=1.0
 EXPLOSION_FRAMES=24
 IMPACT_SIZE_R=0.5
+SWEPT=False # bullets also hit ships they passed through during the last tick, for large dt, see App.crossings
 
 # SIZE RELATED PARAMETERS (height_obj/height_screen)
 SHIP_SIZE_R=0.07
@@ -58,6 +82,15 @@ EXPLOSION_R=3.0
 SHIELD_IMG_R=1.5
 SMOKE_R=0.5
 
+GLYPH_CHARS='0123456789.- ' # characters pre-rendered for numeric HUD labels
+#PROFILER PARAMETERS
+PROFILE_WINDOW=600 # frames kept for the rolling percentiles
+PROFILE_REFRESH=30 # frames between overlay redraws
+# frame phases in order, events also holds whatever the caller does between ticks
+PROFILE_PHASES=('events','PlayerHitPlayer','BulletHitPlayer','agents','bullets','emitters','explosions','labels',
+                'background','hud','draw','flip','wait')
+PROFILE_KEY=pygame.K_F3
+
 BIG_FONT_R=0.08
 NORMAL_FONT_R=0.06
 SMALL_FONT_R=0.03
@@ -66,9 +99,12 @@ SMALL_FONT_R=0.03
 BORDER_W_R=0.03
 BORDER_H_R=0.05
 BORDER_BOTTOM_R=0.09
+HUD_FULL_PLAYERS=2 # up to this many ships get a full HUD corner each, more share a compact grid
+HUD_GAP_R=0.01 # space between compact HUD cells
 
 GAME_W_R=0.3
 GAME_H_R=0.3
+SPAWN_JITTER=0.2 # spawn spread within a grid cell when an arena has more than MAX_PLAYERS ships
 
 
 # STRINGS
@@ -81,13 +117,18 @@ SPEED_S2=''
 FPS_S=' FPS'
 TIME_S1='Round time: '
 TIME_S2=' secs'
+COMPACT_S=HP_S+'{}  '+SCORE_S+'{}'
 
 
 #FIRE CONTROLS
 P1_FIRE=pygame.K_SPACE
 P2_FIRE=pygame.K_1
+# (left, right, up, down, fire) per player, players beyond these have no keyboard
+KEY_BINDINGS=[(pygame.K_LEFT,pygame.K_RIGHT,pygame.K_UP,pygame.K_DOWN,P1_FIRE),
+              (pygame.K_a,pygame.K_d,pygame.K_w,pygame.K_s,P2_FIRE)]
 
 #SOUNDS
+MUSIC_FILE='sounds/run.mp3'
 MUSIC_VOL=0.3
 MUSIC_START_TIME=20
 EXPLOSION_VOL=0.1
@@ -102,6 +143,15 @@ WHITE = (255, 255, 255)
 BLUE =  (  0,   0, 255)
 GREEN = (  0, 255,   0)
 RED =   (255,   0,   0)
+#EFFECT ATLAS, every explosion, flame and smoke frame packed into one surface
+EFFECT_IMAGES=([EXPLOSION_IMG.format(n+1) for n in range(EXPLOSION_FRAMES)]+
+               [FLAME_IMG.format(n+1) for n in range(FLAME_FRAMES)]+
+               [SMOKE_IMG.format(n+1) for n in range(SMOKE_FRAMES)])
+#SNAPSHOT LAYOUT, float64 values per block, see App.get_state
+SNAP_HEADER=17 # ticks, t0, seed, rng state, explosions, ships, bullet slots
+SNAP_SHIP=27
+SNAP_BULLET=12
+SNAP_EXPLOSION=8
 
 
 #GENERAL GEOMETRY FUNCTIONS
@@ -126,30 +176,61 @@ def tonumpy(v):
 
 
 def collisionvels(obj1,obj2,App):
-    v1=obj1.vel.reshape((2,))
-    v2=obj2.vel.reshape((2,))
-    x1=obj1.pos.reshape((2,))
-    x2=obj2.pos.reshape((2,))
-    m1=obj1.mass
-    m2=obj2.mass
-    dt=App.dt
-    
-    dx=norm(x1-x2)
-    
-    u1= ((2*m2/(m1+m2))*(np.dot(v1-v2,x1-x2)/np.dot(x1-x2,x1-x2)))
-    u2= ((2*m1/(m1+m2))*(np.dot(v2-v1,x2-x1)/np.dot(x2-x1,x2-x1)))
-    
-    u1 = v1 - u1*(x1-x2)
-    u2= v2 - u2*(x2-x1)
-    
-    
-    obj1.vel=u1.reshape((2,1))*LOSS
-    obj2.vel=u2.reshape((2,1))*LOSS
+    x1,y1,v1x,v1y=obj1.kinematics()
+    x2,y2,v2x,v2y=obj2.kinematics()
+    v1x,v1y,v2x,v2y=physics.bounce(x1,y1,v1x,v1y,obj1.mass,x2,y2,v2x,v2y,obj2.mass,LOSS)
+    obj1.set_vel(v1x,v1y)
+    obj2.set_vel(v2x,v2y)
     
     obj1.last_collision=obj2
     obj2.last_collision=obj1
 
 
+def approaching(obj1,obj2):
+    x1,y1,v1x,v1y=obj1.kinematics()
+    x2,y2,v2x,v2y=obj2.kinematics()
+    return (v1x-v2x)*(x1-x2)+(v1y-v2y)*(y1-y2)<0
+
+
+def overlaps(sprites1,sprites2):
+    # rect overlap of every sprite in sprites1 against every sprite in sprites2.
+    # collide_mask can only report pairs whose rects overlap
+    a=np.array([tuple(sprite.rect) for sprite in sprites1],dtype=np.int64).reshape((-1,1,4))
+    b=np.array([tuple(sprite.rect) for sprite in sprites2],dtype=np.int64).reshape((1,-1,4))
+    return (a[...,0]<b[...,0]+b[...,2])&(b[...,0]<a[...,0]+a[...,2])&(a[...,1]<b[...,1]+b[...,3])&(b[...,1]<a[...,1]+a[...,3])
+
+
+def swept_mask(obj1,obj2,motion,step):
+    # collide_mask at the current rects and at points back along motion, obj2 relative to obj1,
+    # step pixels apart. The start of the path was the previous tick's test
+    steps=max(1,int(m.ceil(m.hypot(motion[0],motion[1])/step)))
+    mask=obj1.mask
+    other=obj2.mask
+    x=obj2.rect.x-obj1.rect.x
+    y=obj2.rect.y-obj1.rect.y
+    for k in range(steps):
+        back=k/steps
+        if mask.overlap(other,(x-int(round(back*motion[0])),y-int(round(back*motion[1])))):
+            return True
+    return False
+
+
+def words(value,n):
+    # splits a big non negative int into n 32 bit words, exact in float64
+    return [(value>>(32*k))&0xffffffff for k in range(n)]
+
+
+def unwords(values):
+    return sum(int(v)<<(32*k) for k,v in enumerate(values))
+
+
+def collision_code(obj):
+    # ships by number, bullets after them by pool slot
+    if isinstance(obj,Bullet):
+        return PLAYER_LIMIT+obj.slot
+    return obj.number
+
+
 def collide(obj1,obj2):
 
     result= obj1.rect.colliderect(obj2.rect)
@@ -159,40 +240,480 @@ def collide(obj1,obj2):
         return False
 
 
+def hue_shift(surface,degrees):
+    # copy with every pixel's hue rotated around the gray axis, alpha untouched
+    image=surface.copy()
+    c=m.cos(m.radians(degrees))
+    s=m.sin(m.radians(degrees))
+    matrix=np.array([[0.213+c*0.787-s*0.213,0.715-c*0.715-s*0.715,0.072-c*0.072+s*0.928],
+                     [0.213-c*0.213+s*0.143,0.715+c*0.285+s*0.140,0.072-c*0.072-s*0.283],
+                     [0.213-c*0.213-s*0.787,0.715-c*0.715+s*0.715,0.072+c*0.928+s*0.072]])
+    rgb=pygame.surfarray.pixels3d(image)
+    rgb[...]=np.clip(rgb@matrix.T,0,255)
+    del rgb
+    return image
+
+
 #CLASSES
 
+class NullSound():
+    # stands in for pygame.mixer.Sound when running without audio
+    def play(self,*args):
+        pass
+    def fadeout(self,time):
+        pass
+    def stop(self):
+        pass
+    def set_volume(self,value):
+        pass
+
+
+class Assets():
+    # decoded images, scaled copies, rotation frames and sounds, shared by every App in the process
+    # directory: optional on-disk cache of scaled and rotated raw RGBA pixels, rotation
+    # frames are memory-mapped from it so parallel processes share the pages
+    def __init__(self,directory=ASSET_CACHE):
+        self.directory=directory
+        self.images={}
+        self.scaled_images={}
+        self.rotation_sets={}
+        self.atlases={}
+        self.sounds={}
+
+    def image(self,path):
+        # 'file.png@137' is file.png with its hue rotated by 137 degrees
+        image=self.images.get(path)
+        if image is None:
+            source,_,hue=path.partition('@')
+            if hue:
+                image=hue_shift(self.image(source),int(hue))
+            else:
+                image=pygame.image.load(path)
+            self.images[path]=image
+        return image
+
+    def scaled(self,path,size):
+        size=(int(size[0]),int(size[1]))
+        image=self.scaled_images.get((path,size))
+        if image is None:
+            cached=self.cache_path('scaled',path,size)
+            if cached is not None and os.path.isfile(cached):
+                with open(cached,'rb') as f:
+                    image=pygame.image.frombuffer(f.read(),size,'RGBA')
+            else:
+                image=pygame.transform.smoothscale(self.image(path),size)
+                if cached is not None:
+                    self.store(cached,lambda f:f.write(pygame.image.tobytes(image,'RGBA')))
+            self.scaled_images[(path,size)]=image
+        return image
+
+    def rotations(self,surface,buckets,preload):
+        # (images, masks) lists per bucket, shared by every cache registering the same pixels
+        key=(hashlib.md5(pygame.image.tobytes(surface,'RGBA')).hexdigest(),surface.get_size(),surface.get_masks(),buckets)
+        entry=self.rotation_sets.get(key)
+        if entry is None:
+            entry=self.rotation_sets[key]=([None]*buckets,[None]*buckets)
+        images=entry[0]
+        if preload and buckets and None in images:
+            cached=self.cache_path('rotations',key[0],(buckets,))
+            if cached is not None and os.path.isfile(cached+'.sizes.npy'):
+                self.map_rotations(cached,images)
+            else:
+                for n in range(buckets):
+                    if images[n] is None:
+                        images[n]=pygame.transform.rotate(surface,360.0*n/buckets)
+                if cached is not None:
+                    self.store_rotations(cached,images)
+        return entry
+
+    def map_rotations(self,cached,images):
+        pixels=memoryview(np.load(cached+'.npy',mmap_mode='r'))
+        sizes=np.load(cached+'.sizes.npy')
+        convert=pygame.display.get_surface() is not None
+        start=0
+        for n,(w,h) in enumerate(sizes.tolist()):
+            image=pygame.image.frombuffer(pixels[start:start+4*w*h],(w,h),'RGBA')
+            images[n]=image.convert_alpha() if convert else image
+            start+=4*w*h
+
+    def store_rotations(self,cached,images):
+        pixels=b''.join(pygame.image.tobytes(image,'RGBA') for image in images)
+        self.store(cached+'.npy',lambda f:np.save(f,np.frombuffer(pixels,dtype=np.uint8)))
+        # written last, its presence marks a complete entry
+        self.store(cached+'.sizes.npy',lambda f:np.save(f,np.array([image.get_size() for image in images],dtype=np.int32)))
+
+    def atlas(self,paths):
+        # the images packed into one Atlas, decoded once per process or mapped from the disk cache
+        paths=tuple(paths)
+        atlas=self.atlases.get(paths)
+        if atlas is None:
+            cached=self.cache_path('atlas',paths,(len(paths),))
+            if cached is not None and os.path.isfile(cached+'.rects.npy'):
+                pixels=np.load(cached+'.npy',mmap_mode='r')
+                rects=np.load(cached+'.rects.npy').tolist()
+                surface=pygame.image.frombuffer(memoryview(pixels.reshape(-1)),(pixels.shape[1],pixels.shape[0]),'RGBA')
+                atlas=Atlas(surface,{path:pygame.Rect(rect) for path,rect in zip(paths,rects)})
+            else:
+                atlas=pack({path:pygame.image.load(path) for path in paths})
+                if cached is not None:
+                    w,h=atlas.surface.get_size()
+                    pixels=np.frombuffer(pygame.image.tobytes(atlas.surface,'RGBA'),dtype=np.uint8).reshape((h,w,4))
+                    self.store(cached+'.npy',lambda f:np.save(f,pixels))
+                    self.store(cached+'.rects.npy',lambda f:np.save(f,np.array([tuple(atlas.rects[path]) for path in paths],dtype=np.int32)))
+            self.atlases[paths]=atlas
+        return atlas
+
+    def view(self,directory):
+        # the same decoded assets, with its own disk cache directory
+        assets=copy.copy(self)
+        assets.directory=directory
+        return assets
+
+    def sound(self,path):
+        sound=self.sounds.get(path)
+        if sound is None:
+            sound=self.sounds[path]=pygame.mixer.Sound(path)
+        return sound
+
+    def cache_path(self,kind,name,size):
+        if self.directory is None:
+            return None
+        tag=hashlib.md5(repr((kind,name)).encode()).hexdigest()[:16]
+        return os.path.join(self.directory,'{}_{}_{}'.format(kind,tag,'x'.join(str(n) for n in size)))
+
+    def store(self,path,write):
+        # written under a temporary name so other processes never map half a file
+        os.makedirs(self.directory,exist_ok=True)
+        tmp='{}.{}.tmp'.format(path,os.getpid())
+        with open(tmp,'wb') as f:
+            write(f)
+        os.replace(tmp,path)
+
+
+ASSETS=Assets()
+
+
+class Atlas():
+    # named frames packed into one surface, each frame a subsurface sharing its pixels
+    def __init__(self,surface,rects):
+        self.surface=surface
+        self.rects=rects
+        self.frames={name:surface.subsurface(rect) for name,rect in rects.items()}
+        self.scaled_atlases={}
+
+    def frame(self,name):
+        return self.frames[name]
+
+    def scaled(self,names,size):
+        # the named frames smoothscaled to size, packed into an atlas of their own
+        key=(tuple(names),tuple(size))
+        atlas=self.scaled_atlases.get(key)
+        if atlas is None:
+            atlas=self.scaled_atlases[key]=pack({name:pygame.transform.smoothscale(self.frames[name],size) for name in names})
+        return atlas
+
+    def convert(self):
+        return Atlas(self.surface.convert_alpha(),self.rects)
+
+
+def pack(images):
+    # shelf packing, tallest first, into a roughly square SRCALPHA surface
+    order=sorted(images,key=lambda name:-images[name].get_height())
+    width=max(int(m.ceil(m.sqrt(sum(image.get_width()*image.get_height() for image in images.values())))),
+              max(image.get_width() for image in images.values()))
+    rects={}
+    x=y=shelf=0
+    for name in order:
+        w,h=images[name].get_size()
+        if x+w>width:
+            x=0
+            y+=shelf
+            shelf=0
+        rects[name]=pygame.Rect(x,y,w,h)
+        x+=w
+        shelf=max(shelf,h)
+    surface=pygame.Surface((width,y+shelf),pygame.SRCALPHA)
+    surface.fill((0,0,0,0))
+    for name in order:
+        image=images[name]
+        # alpha images are copied as they are, colorkey pixels are left transparent
+        surface.blit(image,rects[name],special_flags=pygame.BLEND_RGBA_MAX if image.get_flags()&pygame.SRCALPHA else 0)
+    return Atlas(surface,rects)
+
+
+class RotationCache():
+    # rotated images per sprite key quantized to buckets per turn, masks built on first collision test
+    def __init__(self,buckets=ROT_BUCKETS,preload=ROT_PRELOAD,assets=ASSETS):
+        self.buckets=buckets
+        self.preload=preload
+        self.assets=assets
+        self.sources={}
+        self.frames={}
+        self.masks={}
+
+    def __contains__(self,key):
+        return key in self.sources
+
+    def add(self,key,surface):
+        if key in self.sources:
+            return
+        self.sources[key]=surface
+        self.frames[key],self.masks[key]=self.assets.rotations(surface,self.buckets,self.preload)
+
+    def get(self,key,angle):
+        # (image, bucket), with 0 buckets the angle itself stands for the bucket
+        if not self.buckets:
+            return pygame.transform.rotate(self.sources[key],m.degrees(angle)),angle
+        n=int(round(m.degrees(angle)*self.buckets/360.0))%self.buckets
+        return self.image(key,n),n
+
+    def image(self,key,n):
+        frame=self.frames[key][n]
+        if frame is None:
+            frame=self.frames[key][n]=pygame.transform.rotate(self.sources[key],360.0*n/self.buckets)
+        return frame
+
+    def mask(self,key,n):
+        if not self.buckets:
+            return pygame.mask.from_surface(self.get(key,n)[0])
+        mask=self.masks[key][n]
+        if mask is None:
+            mask=self.masks[key][n]=pygame.mask.from_surface(self.image(key,n))
+        return mask
+
+
+class Label():
+    # HUD text that is only rendered again when its value changes
+    def __init__(self,font,prefix='',suffix='',color=WHITE):
+        self.font=font
+        self.prefix=prefix
+        self.suffix=suffix
+        self.color=color
+        self.value=None
+        self.surface=None
+
+    def render(self,value):
+        if value!=self.value:
+            self.value=value
+            self.surface=self.font.render(self.prefix+value+self.suffix, True, self.color)
+        return self.surface
+
+
+class Glyphs():
+    # single characters of one font rendered once, GLYPH_CHARS up front
+    def __init__(self,font,color=WHITE,chars=GLYPH_CHARS):
+        self.font=font
+        self.color=color
+        self.surfaces={}
+        for char in chars:
+            self.get(char)
+
+    def get(self,char):
+        glyph=self.surfaces.get(char)
+        if glyph is None:
+            glyph=self.surfaces[char]=self.font.render(char, True, self.color)
+        return glyph
+
+
+class GlyphLabel(Label):
+    # numeric HUD text composed from pre-rendered glyphs, no font rasterization per change
+    def __init__(self,glyphs,prefix='',suffix=''):
+        super().__init__(glyphs.font,prefix,suffix,glyphs.color)
+        self.glyphs=glyphs
+        self.head=self.font.render(prefix, True, self.color)
+        self.tail=self.font.render(suffix, True, self.color)
+        self.buffer=None
+
+    def render(self,value):
+        if value==self.value:
+            return self.surface
+        self.value=value
+        parts=[self.head]+[self.glyphs.get(char) for char in value]+[self.tail]
+        width=sum(part.get_width() for part in parts)
+        height=max(part.get_height() for part in parts)
+        if self.buffer is None or self.buffer.get_width()<width or self.buffer.get_height()<height:
+            self.buffer=pygame.Surface((width,height),pygame.SRCALPHA)
+        self.buffer.fill((0,0,0,0))
+        x=0
+        for part in parts:
+            self.buffer.blit(part,(x,0),special_flags=pygame.BLEND_RGBA_MAX)
+            x+=part.get_width()
+        self.surface=self.buffer.subsurface((0,0,width,height))
+        return self.surface
+
+
+class Profiler():
+    # lap(phase) charges the time since the previous lap to phase, end_frame closes the frame row
+    def __init__(self,window=PROFILE_WINDOW,trace=None):
+        self.index={phase:n for n,phase in enumerate(PROFILE_PHASES)}
+        self.times=np.zeros((window,len(PROFILE_PHASES)))
+        self.row=np.zeros(len(PROFILE_PHASES))
+        self.frames=0
+        self.last=time.perf_counter()
+        self.overlay=False
+        self.surface=None
+        self.trace=None
+        if trace is not None:
+            # one CSV line per frame, milliseconds
+            self.trace=open(trace,'w')
+            self.trace.write('frame,'+','.join(PROFILE_PHASES)+',total\n')
+
+    def lap(self,phase):
+        now=time.perf_counter()
+        self.row[self.index[phase]]+=now-self.last
+        self.last=now
+
+    def end_frame(self):
+        self.times[self.frames%len(self.times)]=self.row
+        if self.trace is not None:
+            ms=self.row*1e3
+            self.trace.write('{},'.format(self.frames)+','.join('{:.4f}'.format(t) for t in ms)+',{:.4f}\n'.format(ms.sum()))
+        self.row[:]=0
+        self.frames+=1
+
+    def percentiles(self,q=(50,99)):
+        # (len(q), phases+1) in milliseconds over the window, the last column is the whole frame
+        n=min(self.frames,len(self.times))
+        if n==0:
+            return np.zeros((len(q),len(PROFILE_PHASES)+1))
+        times=self.times[:n]
+        times=np.concatenate((times,times.sum(axis=1,keepdims=True)),axis=1)
+        return np.percentile(times,q,axis=0)*1e3
+
+    def summary(self):
+        p50,p99,top=self.percentiles((50,99,100))
+        return {phase:{'p50':float(p50[n]),'p99':float(p99[n]),'max':float(top[n])} for n,phase in enumerate(PROFILE_PHASES+('total',))}
+
+    def dump(self,path):
+        with open(path,'w') as f:
+            json.dump({'frames':self.frames,'window':min(self.frames,len(self.times)),'ms':self.summary()},f,indent=1)
+
+    def render(self,font):
+        if self.surface is None or self.frames%PROFILE_REFRESH==0:
+            p50,p99=self.percentiles()
+            rows=[('ms','p50','p99')]+[(phase,'{:.2f}'.format(p50[n]),'{:.2f}'.format(p99[n])) for n,phase in enumerate(PROFILE_PHASES+('total',))]
+            # a name column and two right aligned number columns
+            cells=[[font.render(text,True,WHITE) for text in row] for row in rows]
+            widths=[max(row[c].get_width() for row in cells)+font.get_height() for c in range(3)]
+            self.surface=pygame.Surface((sum(widths),len(cells)*font.get_linesize()),pygame.SRCALPHA)
+            for r,row in enumerate(cells):
+                y=r*font.get_linesize()
+                self.surface.blit(row[0],(0,y))
+                self.surface.blit(row[1],(widths[0]+widths[1]-row[1].get_width(),y))
+                self.surface.blit(row[2],(sum(widths)-row[2].get_width(),y))
+        return self.surface
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace=None
+
+
 class App():
-    def __init__(self,w=0,h=0,frames=60):
-        pygame.init()
+    def __init__(self,w=0,h=0,frames=60,headless=False,rot_buckets=ROT_BUCKETS,rot_preload=ROT_PRELOAD,dirty=False,seed=None,controllers=None,
+                 profile=False,trace=None,asset_cache=None,n_players=MAX_PLAYERS,swept=SWEPT):
+        if not 2<=n_players<=PLAYER_LIMIT:
+            raise ValueError('n_players must be between 2 and {}, got {}'.format(PLAYER_LIMIT,n_players))
+        self.n_players=n_players
+        self.headless=headless
+        self.dirty=dirty # redraw and update only the regions sprites and HUD touched
+        self.swept=swept
+        if not self.headless:
+            pygame.init()
         self.running = True
         self.screen = None
         if w==0 and h==0:
-            self.size = self.width, self.height = pygame.display.Info().current_w, pygame.display.Info().current_h
+            if self.headless:
+                self.size = self.width, self.height = HEADLESS_W, HEADLESS_H
+            else:
+                self.size = self.width, self.height = pygame.display.Info().current_w, pygame.display.Info().current_h
         else:
             self.size = self.width, self.height = w, h
         self.fps=frames
         self.dt=1/self.fps
+        # simulation clock, advanced by dt in on_loop. Every game timer reads it
+        self.ticks=0
+        self.sim_time=0.0
+        # asset_cache: disk cache directory of this App only, ASSET_CACHE is the default for all
+        self.assets=ASSETS
+        if asset_cache is not None:
+            self.assets=ASSETS.view(asset_cache)
+        self.rotcache=RotationCache(rot_buckets,rot_preload,self.assets)
+        # every random draw comes from this match's stream, see seed_match
+        if seed is None:
+            seed=int(np.random.default_rng().integers(2**63))
+        self.seed_match(seed)
+        # callables run with the App at the start of every tick, after the controllers chose
+        # their actions and before any physics, so they see and may override those actions
+        self.tick_hooks=[]
+        # set by set_state, images and HUD are rebuilt on the next render
+        self.stale=False
+        # player number -> Controller, the others are driven by their keyboard bindings or stand still.
+        # A callable is asked for every player's Controller, returning None keeps the default
+        if callable(controllers):
+            controllers={n:controllers(n) for n in range(n_players)}
+        self.controllers={n:c for n,c in (controllers or {}).items() if c is not None}
+        # per phase frame times, None costs one check per phase. PROFILE_KEY toggles the overlay
+        self.profiler=None
+        if profile or trace is not None:
+            self.profiler=Profiler(trace=trace)
         
         
     def __enter__(self):
         return self
 
     
+    def load_image(self,path):
+        if self.headless:
+            return self.assets.image(path)
+        return self.assets.image(path).convert_alpha()
+
+    def player_image(self,template,n):
+        # path of ship n's image, headless ships share the shipped images since only their shape matters
+        path=template.format(n%PLAYER_IMAGES+1)
+        if n<PLAYER_IMAGES or self.headless:
+            return path
+        return '{}@{}'.format(path,(n//PLAYER_IMAGES)*PLAYER_HUE_STEP%360)
+
+    def scaled_image(self,path,size):
+        if self.headless:
+            return self.assets.scaled(path,size)
+        return self.assets.scaled(path,size).convert_alpha()
+
+    def load_sound(self,path,volume):
+        # headless never opens the audio files
+        if self.headless:
+            return NullSound()
+        sound=self.assets.sound(path)
+        sound.set_volume(volume)
+        return sound
+
     def on_init(self):
-        pygame.mixer.pre_init(44100, 16, 2, 4096) #frequency, size, channels, buffersize
-        pygame.init() #turn all of pygame on.
-        self.screen = pygame.display.set_mode((self.width, self.height),pygame.DOUBLEBUF|pygame.HWSURFACE)
-        
-        self.icon=pygame.image.load('images/player1.png').convert_alpha()
-        self.icon=pygame.transform.scale(self.icon, (32, 32))
-        pygame.display.set_icon(self.icon)
-        pygame.display.set_caption(WINDOW_S)
-        
-        self.flags=self.screen.get_flags()
-        
-        self.big_font=pygame.font.Font(None, int(BIG_FONT_R*self.height))
-        self.normal_font=pygame.font.Font(None, int(NORMAL_FONT_R*self.height))
-        self.small_font=pygame.font.Font(None, int(SMALL_FONT_R*self.height))
+        if not self.headless:
+            pygame.mixer.pre_init(44100, 16, 2, 4096) #frequency, size, channels, buffersize
+            pygame.init() #turn all of pygame on.
+            self.screen = pygame.display.set_mode((self.width, self.height),pygame.DOUBLEBUF|pygame.HWSURFACE)
+            
+            self.icon=pygame.image.load('images/player1.png').convert_alpha()
+            self.icon=pygame.transform.scale(self.icon, (32, 32))
+            pygame.display.set_icon(self.icon)
+            pygame.display.set_caption(WINDOW_S)
+            
+            self.flags=self.screen.get_flags()
+            
+            self.big_font=pygame.font.Font(None, int(BIG_FONT_R*self.height))
+            self.normal_font=pygame.font.Font(None, int(NORMAL_FONT_R*self.height))
+            self.small_font=pygame.font.Font(None, int(SMALL_FONT_R*self.height))
+            self.small_glyphs=Glyphs(self.small_font)
+            self.label_time=GlyphLabel(self.small_glyphs,TIME_S1,TIME_S2)
+            self.label_fps=GlyphLabel(self.small_glyphs,'',FPS_S)
+            self.compact_hud=self.n_players>HUD_FULL_PLAYERS
+            if self.compact_hud:
+                # cells wide enough for a logo and two digit values, as many per row as fit
+                gap=int(HUD_GAP_R*self.width)
+                w,h=self.small_font.size(COMPACT_S.format(HP,99))
+                self.hud_cell=(2*h+w+gap,h+gap//2)
+                self.hud_columns=max(1,int((1-2*BORDER_W_R)*self.width)//self.hud_cell[0])
 
         
         self.running = True
@@ -201,64 +722,67 @@ class App():
         self.players=[]
         
         
+        if self.dirty:
+            Drawn=pygame.sprite.RenderUpdates
+        else:
+            Drawn=pygame.sprite.Group
+        
         self.all_sprites=pygame.sprite.Group()
-        self.agents=pygame.sprite.Group()
+        self.agents=Drawn()
         self.emitters=pygame.sprite.Group()
-        self.emitters_visible=pygame.sprite.Group()
-        self.explosions=pygame.sprite.Group()
+        self.emitters_visible=Drawn()
+        self.explosions=Drawn()
         
-        self.bullet_group=pygame.sprite.Group()
+        self.bullet_group=Drawn()
+        self.draw_groups=[self.bullet_group,self.emitters_visible,self.agents,self.explosions]
+        self.hud_rects=[]
         
         self.playerimg=[]
         self.playerimg_shield=[]
         self.playerlogos=[]
         self.flameimg=[]
         self.smokeimg=[]
-        self.explosionimg=[]
         
         self.text_player=[]
         self.text_speed=[]
         self.text_score=[]
         self.text_hp=[]
         
-        self.bg=pygame.image.load("images/starfield.png").convert()
-        self.bg_rect=self.bg.get_rect()
-        self.bg_ar=float(self.bg_rect.width)/float(self.bg_rect.height)
-        self.tile=False
-
-        if self.bg_rect.width>self.width:
-            self.bg=pygame.transform.scale(self.bg,(self.width,self.width/self.bg_ar))
-        elif self.bg_rect.width>self.width:
-            self.bg=pygame.transform.scale(self.bg,(self.height*self.bg_ar,self.height))
-        else:
-            self.tile=True
-
-        for n in range(EXPLOSION_FRAMES):
-            self.explosionimg.append(pygame.image.load("images/explosion/"+str(n+1)+'.png').convert_alpha())
-
-        for n in range(FLAME_FRAMES):
-            self.flameimg.append(pygame.image.load("images/flame"+str(n+1)+'.png').convert_alpha())
+        if not self.headless:
+            self.bg=pygame.image.load("images/starfield.png").convert()
+            self.bg_rect=self.bg.get_rect()
+            self.bg_ar=float(self.bg_rect.width)/float(self.bg_rect.height)
+            self.tile=False
 
-        for n in range(SMOKE_FRAMES):
-            self.smokeimg.append(pygame.image.load("images/smoke"+str(n+1)+'.png').convert_alpha())
+            if self.bg_rect.width>self.width:
+                self.bg=pygame.transform.scale(self.bg,(self.width,self.width/self.bg_ar))
+            elif self.bg_rect.width>self.width:
+                self.bg=pygame.transform.scale(self.bg,(self.height*self.bg_ar,self.height))
+            else:
+                self.tile=True
+            self.build_background()
 
+            # effects are never drawn headless, so their frames are not loaded
+            # one decode for every effect frame, explosions are scaled on first use, see explosion_frame
+            self.effects=self.assets.atlas(EFFECT_IMAGES)
+            self.explosion_cache={}
 
-        self.sound_shot = pygame.mixer.Sound("sounds/laser_shot.wav")
-        self.sound_explosion=pygame.mixer.Sound("sounds/explosion.wav")
-        self.sound_hit=pygame.mixer.Sound("sounds/small_explosion.wav")
-        self.sound_engine=pygame.mixer.Sound("sounds/jet.wav")
+            for n in range(FLAME_FRAMES):
+                self.flameimg.append(self.effects.frame(FLAME_IMG.format(n+1)))
 
+            for n in range(SMOKE_FRAMES):
+                self.smokeimg.append(self.effects.frame(SMOKE_IMG.format(n+1)))
 
 
-        self.sound_shot.set_volume(SHOT_VOL)
-        self.sound_hit.set_volume(HIT_VOL)
-        self.sound_explosion.set_volume(EXPLOSION_VOL)
-        self.sound_engine.set_volume(ENGINE_VOL)
+        self.sound_shot = self.load_sound("sounds/laser_shot.wav",SHOT_VOL)
+        self.sound_explosion=self.load_sound("sounds/explosion.wav",EXPLOSION_VOL)
+        self.sound_hit=self.load_sound("sounds/small_explosion.wav",HIT_VOL)
+        self.sound_engine=self.load_sound("sounds/jet.wav",ENGINE_VOL)
 
 
-        for n in range(MAX_PLAYERS):
-            self.playerimg.append(pygame.image.load("images/player"+str(n+1)+'.png').convert_alpha())
-            self.playerimg_shield.append(pygame.image.load("images/player"+str(n+1)+'_shield2.png').convert_alpha())
+        for n in range(self.n_players):
+            self.playerimg.append(self.load_image(self.player_image(PLAYER_IMG,n)))
+            self.playerimg_shield.append(self.load_image(self.player_image(SHIELD_IMG,n)))
             
             
             
@@ -269,19 +793,28 @@ class App():
 
             
         
-        self.t0=time.time()
+        self.t0=self.sim_time
         
-        self.text_time=self.small_font.render(TIME_S1+"{:.1f}".format(time.time()-self.t0)+TIME_S2, True, WHITE)
-        self.text_fps=self.small_font.render(str(int(self.clock.get_fps()))+FPS_S, True, WHITE)
+        if not self.headless:
+            self.text_time=self.label_time.render("{:.1f}".format(self.sim_time-self.t0))
+            self.text_fps=self.label_fps.render(str(int(self.clock.get_fps())))
 
 
             
-        self.bulletimg=pygame.image.load('images/bullets.png').convert_alpha()
+        self.bulletimg=self.load_image(BULLET_IMG)
+        aspect_ratio=float(self.bulletimg.get_width())/float(self.bulletimg.get_height())
+        self.rotcache.add('bullet',self.scaled_image(BULLET_IMG,(int(aspect_ratio*BULLET_SIZE_R*self.height),int(BULLET_SIZE_R*self.height))))
+        self.bulletpool=BulletPool(self)
         
-        pygame.mixer.music.set_volume(MUSIC_VOL)
-        pygame.mixer.music.load('sounds/run.mp3')
-        pygame.mixer.music.play(MUSIC_START_TIME)
-        pygame.mixer.music.play(-1)
+        if not self.headless and os.path.isfile(MUSIC_FILE):
+            pygame.mixer.music.set_volume(MUSIC_VOL)
+            pygame.mixer.music.load(MUSIC_FILE)
+            pygame.mixer.music.play(MUSIC_START_TIME)
+            pygame.mixer.music.play(-1)
+
+        if self.profiler:
+            # loading is not part of the first frame
+            self.profiler.last=time.perf_counter()
 
 
         
@@ -289,6 +822,38 @@ class App():
         
         
         
+    def seed_match(self,seed=None):
+        # None derives the next match seed from the current stream
+        if seed is None:
+            seed=int(self.rng.integers(2**63))
+        self.seed=seed
+        self.rng=np.random.default_rng(seed)
+
+    def spawn_point(self,n):
+        # anywhere in the middle of the screen. Bigger arenas give every ship a cell of a grid
+        # over the whole screen, so no two start overlapping
+        if self.n_players<=MAX_PLAYERS:
+            x=self.rng.random()*self.width*(1-2*GAME_W_R)+GAME_W_R*self.width
+            y=self.rng.random()*self.height*(1-2*GAME_H_R)+GAME_H_R*self.height
+            return x,y
+        columns=int(m.ceil(m.sqrt(self.n_players*self.width/self.height)))
+        rows=int(m.ceil(self.n_players/columns))
+        x=(n%columns+0.5+SPAWN_JITTER*(self.rng.random()-0.5))*self.width/columns
+        y=(n//columns+0.5+SPAWN_JITTER*(self.rng.random()-0.5))*self.height/rows
+        return x,y
+
+    def explosion_frame(self,scale,n):
+        # every Explosion and Impact of one scale draws subsurfaces of the same scaled atlas
+        atlas=self.explosion_cache.get(scale)
+        if atlas is None:
+            atlas=self.effects.scaled(EFFECT_IMAGES[:EXPLOSION_FRAMES],self.explosion_size(scale))
+            atlas=self.explosion_cache[scale]=atlas.convert()
+        return atlas.frame(EXPLOSION_IMG.format(n+1))
+
+    def explosion_size(self,scale):
+        w,h=self.effects.rects[EXPLOSION_IMG.format(1)].size
+        return (int(float(w)/float(h)*scale*self.height),int(scale*self.height))
+        
     def on_event(self, event):
         keys=pygame.key.get_pressed()
         if event.type == pygame.QUIT:
@@ -300,6 +865,11 @@ class App():
         elif event.type == pygame.KEYDOWN and keys[pygame.K_LALT] or keys[pygame.K_RALT]:
                 if event.key == pygame.K_F4 and alt_pressed:
                         self.running = False
+        elif event.type == pygame.KEYDOWN and event.key==PROFILE_KEY:
+                if self.profiler is None:
+                    self.profiler=Profiler()
+                self.profiler.overlay=not self.profiler.overlay
+                self.full_redraw=True
         elif event.type == pygame.KEYDOWN and (event.key==pygame.K_f or event.key==pygame.K_F10):
                 if self.flags&FULLSCREEN==False:
                     self.flags|=FULLSCREEN
@@ -307,115 +877,309 @@ class App():
                 else:
                     self.flags^=FULLSCREEN
                     self.screen=pygame.display.set_mode(self.size, self.flags)
+                self.build_background()
         else:
             for agent in self.agents:
                 agent.on_event(keys)
         
         
     def on_loop(self):
+        prof=self.profiler
+        for agent in self.agents:
+            agent.controller.act(self,agent)
+        for hook in self.tick_hooks:
+            hook(self)
+        if prof: prof.lap('events')
+        self.ticks+=1
+        self.sim_time=self.ticks*self.dt
         self.PlayerHitPlayer()
+        if prof: prof.lap('PlayerHitPlayer')
         self.BulletHitPlayer()
+        if prof: prof.lap('BulletHitPlayer')
         self.agents.update(self)
-        self.bullet_group.update(self)
+        if prof: prof.lap('agents')
+        self.bulletpool.update(self)
+        if prof: prof.lap('bullets')
         self.emitters.update(self)
+        if prof: prof.lap('emitters')
         self.explosions.update(self)
+        if prof: prof.lap('explosions')
         
         
-        self.text_time=self.small_font.render(TIME_S1+"{:.1f}".format(time.time()-self.t0)+TIME_S2, True, WHITE)
-        self.text_fps=self.small_font.render(str(int(self.clock.get_fps()))+FPS_S, True, WHITE)
+        if not self.headless:
+            self.text_time=self.label_time.render("{:.1f}".format(self.sim_time-self.t0))
+            self.text_fps=self.label_fps.render(str(int(self.clock.get_fps())))
+            if prof: prof.lap('labels')
+        elif prof:
+            prof.end_frame()
         
     def PlayerHitPlayer(self):
+        agents=[self.players[n].sprite for n in range(self.n_players)]
+        near=overlaps(agents,agents)
+        # two ships: both orders of the pair, each bouncing unless that ship's last collision was the other.
+        # Arenas test every pair once and only bounce ships that forgot each other and move together,
+        # otherwise a ship touching two others bounces between them every tick
+        arena=self.n_players>MAX_PLAYERS
+        if arena:
+            near=np.triu(near,1)
+        else:
+            np.fill_diagonal(near,False)
         hits=[]
-        for n in range(MAX_PLAYERS):
-            for p in range(MAX_PLAYERS):
-                if p!=n:
-                    hits.append(pygame.sprite.groupcollide(self.players[n], self.players[p], False, False,collided=pygame.sprite.collide_mask))
-        for hit in hits:
-            for agent,players in hit.items():
-                for player in players:
-                    if agent.last_collision!=player:
-                        collisionvels(agent,player,self)
-                        self.sound_hit.play()
-                        Impact(self,agent,player,self.explosions,self.all_sprites)
-                        if agent.collide:
-                            agent.hp-=1
-                            agent.collisiontime=time.time()
-                        if player.collide:
-                            player.hp-=1
-                            player.collisiontime=time.time()
+        for n,p in zip(*np.nonzero(near)):
+            if pygame.sprite.collide_mask(agents[n],agents[p]):
+                hits.append((agents[n],[agents[p]]))
+        for agent,players in hits:
+            for player in players:
+                if agent.last_collision!=player and (not arena or player.last_collision!=agent and approaching(agent,player)):
+                    collisionvels(agent,player,self)
+                    self.sound_hit.play()
+                    Impact(self,agent,player,self.explosions,self.all_sprites)
+                    if agent.collide:
+                        agent.hp-=1
+                        agent.collisiontime=self.sim_time
+                    if player.collide:
+                        player.hp-=1
+                        player.collisiontime=self.sim_time
                
         
     def BulletHitPlayer(self):
+        agents=[self.players[n].sprite for n in range(self.n_players)]
+        bullets=[]
+        owners=[]
+        for p in range(self.n_players):
+            for bullet in agents[p].bullets:
+                bullets.append(bullet)
+                owners.append(p)
+        if not bullets:
+            return
+        near=overlaps(agents,bullets)
+        crossed=None
+        if self.swept:
+            crossed=self.crossings(agents,bullets)
+            near|=crossed
+        # only the rect overlaps are visited, in ship order, each ship's hits in one list
         hits=[]
-        for n in range(MAX_PLAYERS):
-            for p in range(MAX_PLAYERS):
-                if p!=n:
-                    hits.append(pygame.sprite.groupcollide(self.players[n], self.players[p].sprites()[0].bullets, False, False,collided=pygame.sprite.collide_mask))
-        for hit in hits:
-            for agent, bullets in hit.items():
-                for bullet in bullets:
-                    if bullet not in agent.bullets:
-                        if agent.last_collision!=bullet:
-                            collisionvels(agent,bullet,self)
-                            if agent.collide:
-                                agent.hp-=1
-                                agent.collisiontime=time.time()
-                                Explosion(self,bullet,self.explosions,self.all_sprites)
-                                bullet.kill()
-                            else:
-                                bullet.kill
-                                bullet.add(agent.bullets,self.bullet_group,self.all_sprites)
-                                bullet.number=agent.number
-
-    def on_render(self):
-            
-        self.screen.fill(BLACK)
+        for n,j in zip(*np.nonzero(near)):
+            if owners[j]!=n and (crossed is not None and crossed[n,j] or pygame.sprite.collide_mask(agents[n],bullets[j])):
+                if hits and hits[-1][0] is agents[n]:
+                    hits[-1][1].append(bullets[j])
+                else:
+                    hits.append((agents[n],[bullets[j]]))
+        for agent, bullets in hits:
+            for bullet in bullets:
+                if bullet not in agent.bullets:
+                    if agent.last_collision!=bullet:
+                        collisionvels(agent,bullet,self)
+                        if agent.collide:
+                            agent.hp-=1
+                            agent.collisiontime=self.sim_time
+                            Explosion(self,bullet,self.explosions,self.all_sprites)
+                            bullet.kill()
+                        else:
+                            bullet.remove(self.players[bullet.number].sprite.bullets)
+                            bullet.add(agent.bullets)
+                            bullet.number=agent.number
+
+    def crossings(self,agents,bullets):
+        # (ships, bullets) True where the masks met at any point of the last tick, not just at its end.
+        # Pairs whose bounding circles met along the relative path get the mask test at steps of
+        # one bullet size along it, as a small dt would have done
+        slots=[bullet.slot for bullet in bullets]
+        pool=self.bulletpool
+        ships=np.array([agent.kinematics() for agent in agents])
+        reach=np.array([m.hypot(*agent.rect.size)/2 for agent in agents])
+        rel=pool.pos[slots][None,:,:]-ships[:,None,0:2]
+        motion=self.dt*(pool.vel[slots][None,:,:]-ships[:,None,2:4])
+        crossed=physics.sweep(rel,motion,reach[:,None]+pool.reach)
+        for n,j in zip(*np.nonzero(crossed)):
+            crossed[n,j]=swept_mask(agents[n],bullets[j],motion[n,j],pool.step)
+        return crossed
+
+    def build_background(self):
+        # starfield composed once per display mode, drawn with a single blit
+        self.background=pygame.Surface(self.size).convert()
+        self.background.fill(BLACK)
 
         if self.tile:
             for n in range(int(m.ceil(self.width/self.bg_rect.width))):
                 for p in range(int(m.ceil(self.height/self.bg_rect.height))):
-                    self.screen.blit(self.bg,(n*self.bg_rect.width,p*self.bg_rect.height))
+                    self.background.blit(self.bg,(n*self.bg_rect.width,p*self.bg_rect.height))
         else:
-            self.screen.blit(self.bg,(0,0))
+            self.background.blit(self.bg,(0,0))
+        self.full_redraw=True
 
-        self.screen.blit(self.text_fps,((1-BORDER_W_R)*self.width-self.text_fps.get_width(),(1-BORDER_BOTTOM_R)*self.height-self.text_fps.get_height()))
-        self.screen.blit(self.text_time,(BORDER_W_R*self.width,(1-BORDER_BOTTOM_R)*self.height-self.text_time.get_height()))
+    def on_render(self):
+        prof=self.profiler
+        if self.stale:
+            self.rebuild()
+        partial=self.dirty and not self.full_redraw
+        if partial:
+            for group in self.draw_groups:
+                group.clear(self.screen,self.background)
+            for rect in self.hud_rects:
+                self.screen.blit(self.background,rect,rect)
+            rects=self.hud_rects
+        else:
+            self.screen.blit(self.background,(0,0))
+        if prof: prof.lap('background')
+
+        self.hud_rects=self.draw_hud()
+        if prof: prof.lap('hud')
+
+        for group in self.draw_groups:
+            drawn=group.draw(self.screen)
+            if partial:
+                rects=rects+drawn
+        if prof: prof.lap('draw')
         
+        if partial:
+            pygame.display.update(rects+self.hud_rects)
+        else:
+            pygame.display.flip()
+            self.full_redraw=False
+        if prof: prof.lap('flip')
+        self.clock.tick(self.fps)
+        if prof:
+            prof.lap('wait')
+            prof.end_frame()
+
+    def get_state(self):
+        # simulation state only, as one flat float64 array, see the SNAPSHOT LAYOUT
+        agents=[self.players[n].sprite for n in range(self.n_players)]
+        effects=self.explosions.sprites()
+        pool=self.bulletpool
+        ships=SNAP_HEADER
+        bullets=ships+self.n_players*SNAP_SHIP
+        explosions=bullets+pool.capacity*SNAP_BULLET
+        state=np.empty(explosions+len(effects)*SNAP_EXPLOSION)
+
+        rng=self.rng.bit_generator.state
+        state[:ships]=[self.ticks,self.t0]+words(self.seed,2)+words(rng['state']['state'],4)+words(rng['state']['inc'],4)+[rng['has_uint32'],rng['uinteger'],len(effects),self.n_players,pool.capacity]
+        for agent in agents:
+            agent.get_state(state[ships+agent.number*SNAP_SHIP:ships+(agent.number+1)*SNAP_SHIP])
+        pool.get_state(state[bullets:explosions].reshape((pool.capacity,SNAP_BULLET)))
+        for n,effect in enumerate(effects):
+            state[explosions+n*SNAP_EXPLOSION:explosions+(n+1)*SNAP_EXPLOSION]=effect.get_state()
+        return state
+
+    def set_state(self,state):
+        # restores get_state output of an App with as many ships, images the simulation does not need are rebuilt lazily.
+        # ValueError when the snapshot was taken with another number of ships or bullet slots
+        pool=self.bulletpool
+        ships=SNAP_HEADER
+        bullets=ships+self.n_players*SNAP_SHIP
+        explosions=bullets+pool.capacity*SNAP_BULLET
+
+        if len(state)<ships:
+            raise ValueError('snapshot of {} values is shorter than its header'.format(len(state)))
+        header=state[:ships].tolist()
+        if (int(header[15]),int(header[16]))!=(self.n_players,pool.capacity):
+            raise ValueError('snapshot of {} ships and {} bullet slots, this App has {} and {}'.format(
+                int(header[15]),int(header[16]),self.n_players,pool.capacity))
+        if len(state)!=explosions+int(header[14])*SNAP_EXPLOSION:
+            raise ValueError('snapshot of {} values, expected {}'.format(len(state),explosions+int(header[14])*SNAP_EXPLOSION))
+        self.ticks=int(header[0])
+        self.sim_time=self.ticks*self.dt
+        self.t0=header[1]
+        self.seed=unwords(header[2:4])
+        self.rng.bit_generator.state={'bit_generator':'PCG64','state':{'state':unwords(header[4:8]),'inc':unwords(header[8:12])},
+                                      'has_uint32':int(header[12]),'uinteger':int(header[13])}
+        for n in range(self.n_players):
+            self.players[n].sprite.set_state(state[ships+n*SNAP_SHIP:ships+(n+1)*SNAP_SHIP],self)
+        pool.set_state(state[bullets:explosions].reshape((pool.capacity,SNAP_BULLET)),self)
+        for effect in self.explosions.sprites():
+            effect.kill()
+        for n in range(int(header[14])):
+            restore_effect(self,state[explosions+n*SNAP_EXPLOSION:explosions+(n+1)*SNAP_EXPLOSION])
+        self.stale=not self.headless
+
+    def collider(self,code):
+        # inverse of collision_code
+        if code<PLAYER_LIMIT:
+            return self.players[code].sprite
+        return self.bulletpool.sprites[code-PLAYER_LIMIT]
+
+    def rebuild(self):
+        for effect in self.explosions:
+            effect.load(self)
+        for emitter in self.emitters:
+            emitter.on_render(self)
         for agent in self.agents:
-            self.screen.blit(agent.text_player,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_player.get_width()-agent.playerlogo.get_width()),BORDER_H_R*self.height))
-            self.screen.blit(agent.text_hp,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_hp.get_width()),BORDER_H_R*self.height+agent.text_player.get_height()))
-            self.screen.blit(agent.text_score,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_score.get_width()),BORDER_H_R*self.height+agent.text_player.get_height()+agent.text_hp.get_height())) 
-            self.screen.blit(agent.text_speed,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_speed.get_width()),BORDER_H_R*self.height+agent.text_player.get_height()+agent.text_hp.get_height()+agent.text_score.get_height())) 
-            self.screen.blit(agent.playerlogo,((1-agent.number)*(BORDER_W_R*self.width+agent.text_player.get_width())+agent.number*((1-BORDER_W_R)*self.width-agent.playerlogo.get_width()),BORDER_H_R*self.height))
-
+            agent.render_labels()
+        self.full_redraw=True
+        self.stale=False
 
+    def screen_pixels(self):
+        # (w, h, 3) view of the display surface, locked against blits until the array is deleted
+        return pygame.surfarray.pixels3d(self.screen)
 
-        self.bullet_group.draw(self.screen)
-        self.emitters_visible.draw(self.screen)
-        self.agents.draw(self.screen)
-        self.explosions.draw(self.screen)
-        
+    def draw_hud(self):
+        rects=[]
+        rects.append(self.screen.blit(self.text_fps,((1-BORDER_W_R)*self.width-self.text_fps.get_width(),(1-BORDER_BOTTOM_R)*self.height-self.text_fps.get_height())))
+        rects.append(self.screen.blit(self.text_time,(BORDER_W_R*self.width,(1-BORDER_BOTTOM_R)*self.height-self.text_time.get_height())))
         
-        pygame.display.flip()
-        self.clock.tick(self.fps)
+        if self.compact_hud:
+            for agent in self.agents:
+                x=BORDER_W_R*self.width+agent.number%self.hud_columns*self.hud_cell[0]
+                y=BORDER_H_R*self.height+agent.number//self.hud_columns*self.hud_cell[1]
+                rects.append(self.screen.blit(agent.playerlogo,(x,y)))
+                rects.append(self.screen.blit(agent.text_compact,(x+agent.playerlogo.get_width()+self.hud_cell[1]//2,y)))
+        else:
+            for agent in self.agents:
+                rects.append(self.screen.blit(agent.text_player,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_player.get_width()-agent.playerlogo.get_width()),BORDER_H_R*self.height)))
+                rects.append(self.screen.blit(agent.text_hp,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_hp.get_width()),BORDER_H_R*self.height+agent.text_player.get_height())))
+                rects.append(self.screen.blit(agent.text_score,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_score.get_width()),BORDER_H_R*self.height+agent.text_player.get_height()+agent.text_hp.get_height())))
+                rects.append(self.screen.blit(agent.text_speed,((1-agent.number)*BORDER_W_R*self.width+agent.number*((1-BORDER_W_R)*self.width-agent.text_speed.get_width()),BORDER_H_R*self.height+agent.text_player.get_height()+agent.text_hp.get_height()+agent.text_score.get_height())))
+                rects.append(self.screen.blit(agent.playerlogo,((1-agent.number)*(BORDER_W_R*self.width+agent.text_player.get_width())+agent.number*((1-BORDER_W_R)*self.width-agent.playerlogo.get_width()),BORDER_H_R*self.height)))
+        if self.profiler and self.profiler.overlay:
+            overlay=self.profiler.render(self.small_font)
+            rects.append(self.screen.blit(overlay,((self.width-overlay.get_width())/2,BORDER_H_R*self.height)))
+        return rects
 
     def restart(self):
-        self.t0=time.time()
+        # in arenas a round ends once, ships that died while its explosion ran do not start another.
+        # Two ships keep the original rule, where a second death in that time restarts again
+        if self.n_players>MAX_PLAYERS:
+            for effect in self.explosions:
+                if isinstance(effect,Explosion):
+                    effect.restart=False
+        self.t0=self.sim_time
         for agent in self.agents:
             agent.on_init(self)
 
+    def reset(self,seed=None):
+        # new match: clears bullets, explosions, scores and the simulation clock
+        self.seed_match(seed)
+        for bullet in self.bullet_group.sprites():
+            bullet.kill()
+        for explosion in self.explosions.sprites():
+            explosion.kill()
+        self.ticks=0
+        self.sim_time=0.0
+        for agent in self.agents:
+            agent.score=-1
+        self.restart()
+
     def on_cleanup(self):
+        if self.profiler:
+            self.profiler.close()
         pygame.quit()
  
-    def on_execute(self):
+    def on_execute(self,ticks=None):
         if self.on_init() == False:
             self.running = False
       
         while( self.running ):
-            for event in pygame.event.get():
-                self.on_event(event)
+            if not self.headless:
+                for event in pygame.event.get():
+                    self.on_event(event)
             self.on_loop()
-            self.on_render()
+            if not self.headless:
+                self.on_render()
+            if ticks is not None:
+                ticks-=1
+                if ticks<=0:
+                    self.running = False
         self.on_cleanup()
     def __exit__(self,exc_type, exc_value, traceback):
         pygame.quit()
@@ -424,6 +1188,17 @@ class App():
 
 
 
+class Body():
+    # ship kinematics as plain floats, updated in place every tick
+    __slots__=('x','y','vx','vy')
+
+    def __init__(self,x=0.0,y=0.0,vx=0.0,vy=0.0):
+        self.x=x
+        self.y=y
+        self.vx=vx
+        self.vy=vy
+
+
 class Human(pygame.sprite.Sprite):
     def __init__(self,App,n,*sprite_groups):
         super().__init__(*sprite_groups)
@@ -432,37 +1207,55 @@ class Human(pygame.sprite.Sprite):
         self.score=-1
         self.MAX_SPEED=App.height*MAX_SPEED_R
         self.THRUST_V=self.MAX_SPEED/DRAG_TIME        
-        self.controls=Control(self)
+        self.controller=App.controllers.get(n) or default_controller(n)
+        self.compact=not App.headless and App.compact_hud
         self.bullets=pygame.sprite.Group()
+        self.emitter=None
+        self.rotcache=App.rotcache
+        self.body=Body()
+        if self.compact:
+            self.label_compact=Label(App.small_font)
+        elif not App.headless:
+            self.label_player=Label(App.big_font)
+            self.label_speed=GlyphLabel(App.small_glyphs,SPEED_S1,SPEED_S2)
+            self.label_score=Label(App.normal_font,SCORE_S)
+            self.label_hp=Label(App.normal_font,HP_S)
 
         self.on_init(App)
             
     def on_init(self,App):
         self.dead=False
         self.score+=1
-        self.pos=np.array([np.random.random_sample()*App.width*(1-2*GAME_W_R)+GAME_W_R*App.width,np.random.random_sample()*App.height*(1-2*GAME_H_R)+GAME_H_R*App.height]).reshape((2,1))
+        self.body.x,self.body.y=App.spawn_point(self.number)
         self.wrap(App)
-        self.vel=np.zeros((2,1))
-        self.accel=np.zeros((2,1))
-        self.angle=np.random.random_sample()*(2*np.pi)
+        self.body.vx=0.0
+        self.body.vy=0.0
+        self.angle=App.rng.random()*(2*np.pi)
+        self.action=(0,0,0)
         self.rot=0
-        self.hp=3
+        self.hp=HP
         self.thrust=0
         self.fire=False
-        self.last_fire=time.time()
+        self.last_fire=App.sim_time
         self.collide=False
         self.collide_prev=self.collide
-        self.collisiontime=time.time()
+        self.collisiontime=App.sim_time
         self.last_collision=self
         
 
-        self.text_player=App.big_font.render(PLAYER_S, True, WHITE)
-        self.text_speed=App.small_font.render(SPEED_S1+"{:3.1f}".format(norm(self.vel)*100/(self.MAX_SPEED))+SPEED_S2, True, WHITE)
-        self.text_score=App.normal_font.render(SCORE_S+str(self.score), True, WHITE)
-        self.text_hp=App.normal_font.render(HP_S+str(self.hp), True, WHITE)
-        self.playerlogo=pygame.transform.scale(App.playerimg[self.number],(int(App.playerimg[self.number].get_width()*self.text_player.get_height()/App.playerimg[self.number].get_height()),int(self.text_player.get_height())))
+        if not App.headless:
+            if self.compact:
+                self.render_labels()
+                height=self.text_compact.get_height()
+            else:
+                self.text_player=self.label_player.render(PLAYER_S)
+                self.render_labels()
+                height=self.text_player.get_height()
+            self.playerlogo=pygame.transform.scale(App.playerimg[self.number],(int(App.playerimg[self.number].get_width()*height/App.playerimg[self.number].get_height()),int(height)))
 
 
+        if self.emitter is not None:
+            self.emitter.kill()
         self.emitter=Emitter(self,App,App.emitters,App.all_sprites)
 
 
@@ -475,84 +1268,104 @@ class Human(pygame.sprite.Sprite):
         self.resize(App)
         self.load_rot()
         self.rect=self.image.get_rect()
-        self.mask = pygame.mask.from_surface(self.image)    
         
     def resize(self,App):
-        self.original=pygame.transform.smoothscale(self.original,(int(self.aspect_ratio*self.scale*App.height),int(self.scale*App.height)))
-        self.original_shield=pygame.transform.smoothscale(self.original_shield,(int(SHIELD_IMG_R*self.aspect_ratio*self.scale*App.height),int(SHIELD_IMG_R*self.scale*App.height)))
-        self.mask_orig = pygame.mask.from_surface(self.original)
+        self.original=App.scaled_image(App.player_image(PLAYER_IMG,self.number),(int(self.aspect_ratio*self.scale*App.height),int(self.scale*App.height)))
+        self.original_shield=App.scaled_image(App.player_image(SHIELD_IMG,self.number),(int(SHIELD_IMG_R*self.aspect_ratio*self.scale*App.height),int(SHIELD_IMG_R*self.scale*App.height)))
+        App.rotcache.add(('ship',self.number),self.original)
+        App.rotcache.add(('shield',self.number),self.original_shield)
         if self.collide:
             self.image=self.original
         else:
             self.image=self.original_shield
         self.rect=self.image.get_rect()
-        self.mask = pygame.mask.from_surface(self.image)
         
+    @property
+    def mask(self):
+        # built on the first collision test at this rotation
+        return self.rotcache.mask(self.rotkey,self.bucket)
+        
+    @property
+    def pos(self):
+        return np.array([[self.body.x],[self.body.y]])
+
+    @pos.setter
+    def pos(self,value):
+        value=np.ravel(value)
+        self.body.x=float(value[0])
+        self.body.y=float(value[1])
+
+    @property
+    def vel(self):
+        return np.array([[self.body.vx],[self.body.vy]])
+
+    @vel.setter
+    def vel(self,value):
+        value=np.ravel(value)
+        self.set_vel(float(value[0]),float(value[1]))
+
+    def kinematics(self):
+        return self.body.x,self.body.y,self.body.vx,self.body.vy
+
+    def set_vel(self,vx,vy):
+        self.body.vx=vx
+        self.body.vy=vy
+
+    def speed(self):
+        return abs(self.body.vx)+abs(self.body.vy)
+
     def move(self):
-        self.rect.move_ip(tuple(self.pos-tonumpy(self.rect.center)))
+        self.rect.move_ip(self.body.x-self.rect.centerx,self.body.y-self.rect.centery)
         
         
-    def rotate(self,angle,orig):
+    def rotate(self,angle,key):
         old=self.rect.center
-        self.image = pygame.transform.rotate(orig, m.degrees(angle))
+        self.rotkey=key
+        self.image,self.bucket = self.rotcache.get(key,angle)
         self.rect=self.image.get_rect(center=old)
-        self.mask = pygame.mask.from_surface(self.image)
     
     def load_rot(self):
         if self.collide:
-            self.rotate(self.angle,self.original)
+            self.rotate(self.angle,('ship',self.number))
         else:
-            self.rotate(self.angle,self.original_shield)
+            self.rotate(self.angle,('shield',self.number))
         
     
     def on_event(self, keys):
-        if keys[self.controls.left] and keys[self.controls.right]:
-            self.rot=0
-        elif keys[self.controls.left]:
-            self.rot=OMEGA
-        elif keys[self.controls.right]:
-            self.rot=-OMEGA
-        else: self.rot=0
-        
-        if keys[self.controls.up] and keys[self.controls.down]:
-            self.thrust=0
-        elif keys[self.controls.up]:
+        self.controller.on_event(self,keys)
+
+    def set_action(self,rot,thrust,fire):
+        # rot: 1 left, -1 right. thrust: 1 forward, -1 backwards. fire: bool
+        self.action=(int(rot),int(thrust),int(bool(fire)))
+        self.rot=rot*OMEGA
+        
+        if thrust>0:
             self.thrust=self.THRUST_V
-        elif keys[self.controls.down]:
+        elif thrust<0:
             self.thrust=-BREAK*self.THRUST_V
         else:
             self.thrust=0
         
-        if keys[self.controls.fire]:
-            self.fire=True
-        else:
-            self.fire=False
+        self.fire=bool(fire)
 
 
     def shoot(self,App):
-        now=time.time()
+        now=App.sim_time
         if len(self.bullets)<=MAX_BULLETS and now-self.last_fire>=1./RATE_OF_FIRE and self.collide:
-            self.last_fire=now
-            App.sound_shot.play()
-            Bullet(self,App,App.bullet_group,self.bullets,App.all_sprites)
+            if App.bulletpool.spawn(self,App) is not None:
+                self.last_fire=now
+                App.sound_shot.play()
 
     def wrap(self,App):
-        b=np.array([[App.width+1.0,App.height+1.0]]).reshape((2,1))
-        self.pos=np.remainder(self.pos,b)
+        self.body.x%=App.width+1.0
+        self.body.y%=App.height+1.0
         
         
         
     def update(self,App):
-        self.angle+=App.dt*self.rot*2*m.pi
-        
-        self.accel=VectorfromAngle(self.angle)*self.thrust
-               
-        self.vel+=App.dt*(self.accel-self.vel/DRAG_TIME)
-        if norm(self.vel)> self.MAX_SPEED:
-            self.vel=unit(self.vel)*self.MAX_SPEED
-        
-        self.pos+=App.dt*self.vel
-        self.wrap(App)
+        body=self.body
+        body.x,body.y,body.vx,body.vy,self.angle=physics.advance(body.x,body.y,body.vx,body.vy,self.angle,self.rot,self.thrust,
+                                                                App.dt,self.MAX_SPEED,DRAG_TIME,App.width+1.0,App.height+1.0)
         
         
         
@@ -564,7 +1377,7 @@ class Human(pygame.sprite.Sprite):
         else:
             self.emitter.visible=False
 
-        if time.time()-App.t0 > INIT_COOLDOWN and time.time()-self.collisiontime> COOLDOWN:
+        if App.sim_time-App.t0 > INIT_COOLDOWN and App.sim_time-self.collisiontime> COOLDOWN:
             self.collide_prev=self.collide
             self.collide=True
             
@@ -572,8 +1385,8 @@ class Human(pygame.sprite.Sprite):
             self.collide_prev=self.collide
             self.collide=False
             
-        if self.emitter.visible or self.emitter.smoke:
-            self.emitter.pos=self.pos-VectorfromAngle(self.angle)*self.mask_orig.get_size()[0]
+        if not App.headless and (self.emitter.visible or self.emitter.smoke):
+            self.emitter.pos=self.pos-VectorfromAngle(self.angle)*self.original.get_width()
             self.emitter.angle=self.angle
         
         
@@ -587,13 +1400,49 @@ class Human(pygame.sprite.Sprite):
 
 
         
-        self.text_speed=App.small_font.render(SPEED_S1+"{:3.1f}".format(norm(self.vel)*100/(self.MAX_SPEED))+SPEED_S2, True, WHITE)
-        self.text_score=App.normal_font.render(SCORE_S+str(self.score), True, WHITE)
-        self.text_hp=App.normal_font.render(HP_S+str(self.hp), True, WHITE)
+        if not App.headless:
+            self.render_labels()
         
 
         self.on_render(App)
         
+    def render_labels(self):
+        if self.compact:
+            self.text_compact=self.label_compact.render(COMPACT_S.format(self.hp,self.score))
+            return
+        self.text_speed=self.label_speed.render("{:3.1f}".format(self.speed()*100/(self.MAX_SPEED)))
+        self.text_score=self.label_score.render(str(self.score))
+        self.text_hp=self.label_hp.render(str(self.hp))
+
+    def get_state(self,row):
+        b=self.body
+        e=self.emitter
+        row[:]=(b.x,b.y,b.vx,b.vy,self.angle,self.rot,self.thrust,self.fire)+self.action+(
+            self.hp,self.score,self.dead,self.last_fire,self.collide,self.collide_prev,self.collisiontime,
+            collision_code(self.last_collision),self.rect.x,self.rect.y,
+            e.frame,e.time_of_frame,e.timer,e.visible,e.visible_prev,e.smoke)
+
+    def set_state(self,row,App):
+        b=self.body
+        e=self.emitter
+        (b.x,b.y,b.vx,b.vy,self.angle,self.rot,self.thrust,fire,a0,a1,a2,hp,score,dead,self.last_fire,
+         collide,collide_prev,self.collisiontime,code,x,y,
+         frame,e.time_of_frame,e.timer,visible,visible_prev,smoke)=row.tolist()
+        self.fire=bool(fire)
+        self.action=(int(a0),int(a1),int(a2))
+        self.hp=int(hp)
+        self.score=int(score)
+        self.dead=bool(dead)
+        self.collide=bool(collide)
+        self.collide_prev=bool(collide_prev)
+        self.last_collision=App.collider(int(code))
+        self.load_rot()
+        self.rect.topleft=(int(x),int(y))
+        e.frame=int(frame)
+        e.visible=bool(visible)
+        e.visible_prev=bool(visible_prev)
+        e.smoke=bool(smoke)
+        
     def on_render(self,App):
         if self.collide!=self.collide_prev or self.rot!=0:
             self.load_rot()
@@ -608,82 +1457,207 @@ class Human(pygame.sprite.Sprite):
         
     
 
-class Control():
-    def __init__(self,Human):
-        if Human.number==0:
-            self.left=pygame.K_LEFT
-            self.right=pygame.K_RIGHT
-            self.up=pygame.K_UP
-            self.down=pygame.K_DOWN
-            self.fire=P1_FIRE
-        elif Human.number==1:
-            self.left=pygame.K_a
-            self.right=pygame.K_d
-            self.up=pygame.K_w
-            self.down=pygame.K_s
-            self.fire=P2_FIRE
-        else:
-            print('ERROR: MAX_PLAYERS>2, please define more controls')
-    
+class Controller():
+    # drives one ship: on_event sees every input event, act runs at the start of every tick
+    def on_event(self,agent,keys):
+        pass
 
+    def act(self,App,agent):
+        pass
 
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self,Human,App,*sprite_groups):
-        super().__init__(*sprite_groups)
+
+class KeyboardController(Controller):
+    def __init__(self,left,right,up,down,fire):
+        self.left=left
+        self.right=right
+        self.up=up
+        self.down=down
+        self.fire=fire
+
+    def on_event(self,agent,keys):
+        agent.set_action(keys[self.left]-keys[self.right],keys[self.up]-keys[self.down],keys[self.fire])
+
+
+def default_controller(n):
+    if n<len(KEY_BINDINGS):
+        return KeyboardController(*KEY_BINDINGS[n])
+    return Controller()
+
+
+
+class BulletPool():
+    # fixed bullet slots: state in NumPy arrays, one reusable sprite per slot.
+    # Every player fires into its own block of MAX_BULLETS+1 slots, enough for its
+    # own shot limit. A bullet deflected by a shield keeps its slot, so the shooter
+    # may find its block full and take a free slot of another block
+    def __init__(self,App):
+        self.slots=MAX_BULLETS+1
+        self.capacity=capacity=App.n_players*self.slots
         self.BULLET_VEL=App.height*BULLET_VEL_R
-        self.angle=Human.angle
-        self.pos=Human.pos
-        self.vel=Human.vel+VectorfromAngle(self.angle)*self.BULLET_VEL
-        self.mass=Human.mass*MASS_RATIO
-        self.collisiontime=time.time()
-        self.last_collision=self
-        self.number=Human.number
-        
-        self.scale=BULLET_SIZE_R
+        # swept collisions: farthest a bullet pixel gets from its centre, and the path sampling step
+        self.reach=m.hypot(*App.bulletimg.get_size())*BULLET_SIZE_R*App.height/App.bulletimg.get_height()/2
+        self.step=BULLET_SIZE_R*App.height
+        self.pos=np.zeros((capacity,2))
+        self.vel=np.zeros((capacity,2))
+        self.angle=np.zeros(capacity)
+        self.mass=np.zeros(capacity)
+        self.owner=np.zeros(capacity,dtype=np.int64)
+        self.alive=np.zeros(capacity,dtype=bool)
+        self.sprites=[Bullet(self,n,App) for n in range(capacity)]
+
+    def free(self,Human):
+        # a free slot, Human's block first. None when every slot is in use
+        start=Human.number*self.slots
+        for n in range(start,start+self.slots):
+            if not self.alive[n]:
+                return n
+        free=np.flatnonzero(~self.alive)
+        return free[0] if len(free) else None
+
+    def spawn(self,Human,App):
+        n=self.free(Human)
+        if n is None:
+            return None
+        body=Human.body
+        vx,vy,body.vx,body.vy=physics.launch(body.vx,body.vy,Human.angle,self.BULLET_VEL,MASS_RATIO)
+        self.angle[n]=Human.angle
+        self.pos[n]=body.x,body.y
+        self.vel[n]=vx,vy
+        self.mass[n]=Human.mass*MASS_RATIO
+        self.owner[n]=Human.number
+        self.alive[n]=True
+        
+        bullet=self.sprites[n]
+        # a ship still touching this slot's previous bullet must not ignore the new one
+        for agent in App.agents:
+            if agent.last_collision is bullet:
+                agent.last_collision=agent
+        bullet.load(App)
+        bullet.add(App.bullet_group,Human.bullets,App.all_sprites)
+        return bullet
+
+    def get_state(self,block):
+        # block: (capacity, SNAP_BULLET)
+        block[:,0:2]=self.pos
+        block[:,2:4]=self.vel
+        block[:,4]=self.angle
+        block[:,5]=self.mass
+        block[:,6]=self.owner
+        block[:,7]=self.alive
+        block[:,8:]=0
+        for n in np.flatnonzero(self.alive):
+            bullet=self.sprites[n]
+            block[n,8:]=collision_code(bullet.last_collision),bullet.collisiontime,bullet.rect.x,bullet.rect.y
+
+    def set_state(self,block,App):
+        self.pos[:]=block[:,0:2]
+        self.vel[:]=block[:,2:4]
+        self.angle[:]=block[:,4]
+        self.mass[:]=block[:,5]
+        self.owner[:]=block[:,6]
+        self.alive[:]=block[:,7]!=0
+        for bullet in self.sprites:
+            bullet.remove(*bullet.groups())
+        for n in np.flatnonzero(self.alive):
+            bullet=self.sprites[n]
+            code,bullet.collisiontime,x,y=block[n,8:].tolist()
+            bullet.last_collision=App.collider(int(code))
+            bullet.rotate(self.angle[n])
+            bullet.rect.topleft=(int(x),int(y))
+            bullet.add(App.bullet_group,App.players[self.owner[n]].sprite.bullets,App.all_sprites)
+
+    def update(self,App):
+        alive=self.alive
+        np.add(self.pos,App.dt*self.vel,out=self.pos,where=alive[:,None])
         
-        Human.vel-=MASS_RATIO*self.vel
+        x=self.pos[:,0]
+        y=self.pos[:,1]
+        for n in np.flatnonzero(alive&((x>App.width)|(x<0)|(y>App.height)|(y<0))):
+            self.sprites[n].kill()
         
-        self.load(App)
+        for n in np.flatnonzero(alive):
+            bullet=self.sprites[n]
+            if not collide(bullet,bullet.last_collision):
+                bullet.last_collision=bullet
+            bullet.on_render(App)
+
+
+class Bullet(pygame.sprite.Sprite):
+    # view of one BulletPool slot, used for drawing and mask collisions
+    def __init__(self,pool,slot,App):
+        super().__init__()
+        self.pool=pool
+        self.slot=slot
+        self.scale=BULLET_SIZE_R
+        self.rotcache=App.rotcache
+        self.last_collision=self
+        self.collisiontime=App.sim_time
     
+    @property
+    def pos(self):
+        return self.pool.pos[self.slot].reshape((2,1))
+
+    @pos.setter
+    def pos(self,value):
+        self.pool.pos[self.slot]=np.reshape(value,(2,))
+
+    @property
+    def vel(self):
+        return self.pool.vel[self.slot].reshape((2,1))
+
+    @vel.setter
+    def vel(self,value):
+        self.pool.vel[self.slot]=np.reshape(value,(2,))
+
+    @property
+    def angle(self):
+        return self.pool.angle[self.slot]
+
+    def kinematics(self):
+        pos=self.pool.pos[self.slot]
+        vel=self.pool.vel[self.slot]
+        return float(pos[0]),float(pos[1]),float(vel[0]),float(vel[1])
+
+    def set_vel(self,vx,vy):
+        vel=self.pool.vel[self.slot]
+        vel[0]=vx
+        vel[1]=vy
+
+    @property
+    def mass(self):
+        return self.pool.mass[self.slot]
+
+    @property
+    def number(self):
+        return self.pool.owner[self.slot]
+
+    @number.setter
+    def number(self,value):
+        self.pool.owner[self.slot]=value
     
-    def resize(self,App):
-        self.original=pygame.transform.smoothscale(self.original,(int(self.aspect_ratio*self.scale*App.height),int(self.scale*App.height)))
-        self.image = self.original
-        self.rect=self.image.get_rect()
-        
     def move(self):
-        self.rect.move_ip(tuple(self.pos-tonumpy(self.rect.center)))
+        pos=self.pool.pos[self.slot]
+        self.rect.move_ip(float(pos[0])-self.rect.centerx,float(pos[1])-self.rect.centery)
         
         
+    @property
+    def mask(self):
+        return self.rotcache.mask('bullet',self.bucket)
+
     def rotate(self,angle):
-        old=self.rect.center
-        self.image = pygame.transform.rotate(self.original, m.degrees(angle))
-        self.rect=self.image.get_rect(center=old)
-        self.mask = pygame.mask.from_surface(self.image)
+        self.image,self.bucket = self.rotcache.get('bullet',angle)
+        self.rect=self.image.get_rect()
     
     
     def load(self,App):
-        self.original=App.bulletimg
-        self.aspect_ratio=float(self.original.get_width())/float(self.original.get_height())
-        
-        
-        self.resize(App)
+        self.last_collision=self
+        self.collisiontime=App.sim_time
         self.rotate(self.angle)
         self.move()
-        
-    def update(self,App):
-               
-        self.pos+=App.dt*self.vel
-        
-        if  self.pos[0]>App.width or self.pos[0]<0 or self.pos[1]>App.height or self.pos[1]<0:
-            self.kill()
-        
-        
-        if not collide(self,self.last_collision):
-            self.last_collision=self
 
-
-        self.on_render(App)
+    def kill(self):
+        self.pool.alive[self.slot]=False
+        super().kill()
 
     def on_render(self,App):
         self.move()
@@ -700,8 +1674,8 @@ class Emitter(pygame.sprite.Sprite):
 
         self.tpf=1.0/(FLAME_FRAMES*FLAME_RATE)
 
-        self.time_of_frame=time.time()
-        self.timer=time.time()
+        self.time_of_frame=App.sim_time
+        self.timer=App.sim_time
 
         self.visible=False
         self.visible_prev=False
@@ -709,6 +1683,7 @@ class Emitter(pygame.sprite.Sprite):
 
 
         self.sound=App.sound_engine
+        self.rotcache=App.rotcache
         
         self.scale=FLAME_SIZE_R
         self.scale_smoke=self.scale*SMOKE_R
@@ -723,27 +1698,28 @@ class Emitter(pygame.sprite.Sprite):
         for n in range(len(App.smokeimg)):
             self.aspect_ratio_smoke.append(float(self.original_smoke[n].get_width())/float(self.original_smoke[n].get_height()))
         
-        self.resize(App)
-        self.load(App)
+        if not App.headless:
+            self.resize(App)
+            self.load(App)
         
     
     def resize(self,App):
         for n in range(len(self.original)):
-            self.original[n]=pygame.transform.smoothscale(self.original[n],(int(self.aspect_ratio[n]*self.scale*App.height),int(self.scale*App.height)))
+            if ('flame',n) not in self.rotcache:
+                self.rotcache.add(('flame',n),pygame.transform.smoothscale(self.original[n],(int(self.aspect_ratio[n]*self.scale*App.height),int(self.scale*App.height))))
         for n in range(len(self.original_smoke)):
-            self.original_smoke[n]=pygame.transform.smoothscale(self.original_smoke[n],(int(self.aspect_ratio_smoke[n]*self.scale_smoke*App.height),int(self.scale_smoke*App.height)))
+            if ('smoke',n) not in self.rotcache:
+                self.rotcache.add(('smoke',n),pygame.transform.smoothscale(self.original_smoke[n],(int(self.aspect_ratio_smoke[n]*self.scale_smoke*App.height),int(self.scale_smoke*App.height))))
         
     def move(self):
-        self.rect.move_ip(tuple(self.pos-tonumpy(self.rect.center)))
+        self.rect.move_ip(tuple((self.pos-tonumpy(self.rect.center)).ravel()))
         
         
     def rotate(self,angle):
         if self.smoke:
-            self.image=pygame.transform.rotate(self.original_smoke[self.frame%FLAME_FRAMES], m.degrees(angle))
-        elif self.visible:
-            self.image=pygame.transform.rotate(self.original[self.frame%FLAME_FRAMES], m.degrees(angle))
+            self.image,bucket=self.rotcache.get(('smoke',self.frame%SMOKE_FRAMES),angle)
         else:
-            self.image=pygame.transform.rotate(self.original[self.frame%FLAME_FRAMES], m.degrees(angle))
+            self.image,bucket=self.rotcache.get(('flame',self.frame%FLAME_FRAMES),angle)
         
         self.rect=self.image.get_rect()
         
@@ -753,13 +1729,13 @@ class Emitter(pygame.sprite.Sprite):
         
         self.rotate(self.angle)
         if self.smoke:
-            self.rect.move_ip(tuple(self.pos-tonumpy(self.rect.center)+VectorfromAngle(self.angle)*self.rect.width/3))
+            self.rect.move_ip(tuple((self.pos-tonumpy(self.rect.center)+VectorfromAngle(self.angle)*self.rect.width/3).ravel()))
         else:
             self.move()
         
     def update(self,App):
         if self.visible or self.smoke:
-            now=time.time()
+            now=App.sim_time
             if now-self.time_of_frame>=self.tpf:
                 self.frame+=1
                 self.time_of_frame=now
@@ -773,7 +1749,7 @@ class Emitter(pygame.sprite.Sprite):
             if self.visible:
                 self.sound.play(-1)
             else:
-                self.timer=time.time()
+                self.timer=App.sim_time
                 self.smoke=True
                 self.sound.fadeout(ENGINE_FADEOUT)
 
@@ -783,6 +1759,8 @@ class Emitter(pygame.sprite.Sprite):
         self.on_render(App)
         
     def on_render(self,App):
+        if App.headless:
+            return
         self.load(App)
 
         if self.visible or self.smoke:
@@ -791,11 +1769,28 @@ class Emitter(pygame.sprite.Sprite):
             self.remove(App.emitters_visible)
 
 
+def restore_effect(App,row):
+    # rebuilds an Explosion or Impact from its snapshot row without sounds or images
+    kind,x,y,frame,scale,time_of_frame,restart,exists=row.tolist()
+    Effect=Impact if kind else Explosion
+    effect=Effect.__new__(Effect)
+    pygame.sprite.Sprite.__init__(effect,App.explosions,App.all_sprites)
+    effect.pos=np.array([[x],[y]])
+    effect.frame=int(frame)
+    effect.scale=scale
+    effect.tpf=EXPLOSION_TIME/EXPLOSION_FRAMES
+    effect.time_of_frame=time_of_frame
+    if Effect is Explosion:
+        effect.restart=bool(restart)
+        effect.exists=bool(exists)
+    return effect
+
+
 class Explosion(pygame.sprite.Sprite):
     def __init__(self,App,obj,*sprite_groups):
         super().__init__(*sprite_groups)
         
-        self.pos=obj.pos
+        self.pos=obj.pos.copy()
         
 
         self.frame=0
@@ -805,7 +1800,7 @@ class Explosion(pygame.sprite.Sprite):
 
         self.tpf=EXPLOSION_TIME/EXPLOSION_FRAMES
 
-        self.time_of_frame=time.time()
+        self.time_of_frame=App.sim_time
 
         if isinstance(obj,Human):
             self.restart=True
@@ -819,33 +1814,29 @@ class Explosion(pygame.sprite.Sprite):
         else:
             App.sound_explosion.play()
 
-        self.load(App)
+        if not App.headless:
+            self.load(App)
     
     
-    def resize(self,App):
-        self.original=pygame.transform.smoothscale(self.original,(int(self.aspect_ratio*self.scale*App.height),int(self.scale*App.height)))
-        self.image=self.original
-        self.rect=self.image.get_rect()
-        
     def move(self):
-        self.rect.move_ip(tuple(self.pos-tonumpy(self.rect.center)))
+        self.rect.move_ip(tuple((self.pos-tonumpy(self.rect.center)).ravel()))
         
     def load(self,App):
-         
-        self.original=App.explosionimg[self.frame]
-        self.aspect_ratio=float(self.original.get_width())/float(self.original.get_height())
-        
-        
-        self.resize(App)
+        self.image=App.explosion_frame(self.scale,self.frame)
+        self.rect=self.image.get_rect()
         
         self.move()
         
 
 
+    def get_state(self):
+        return (0,self.pos[0,0],self.pos[1,0],self.frame,self.scale,self.time_of_frame,self.restart,self.exists)
+
     def update(self,App):
         if self.exists:
-            self.load(App)
-            now=time.time()
+            if not App.headless:
+                self.load(App)
+            now=App.sim_time
             if now-self.time_of_frame>=self.tpf:
                 self.frame+=1
                 self.time_of_frame=now
@@ -870,39 +1861,35 @@ class Impact(pygame.sprite.Sprite):
 
         self.tpf=EXPLOSION_TIME/EXPLOSION_FRAMES
 
-        self.time_of_frame=time.time()
+        self.time_of_frame=App.sim_time
 
 
         
         App.sound_hit.play()
         
 
-        self.load(App)
+        if not App.headless:
+            self.load(App)
     
     
-    def resize(self,App):
-        self.original=pygame.transform.smoothscale(self.original,(int(self.aspect_ratio*self.scale*App.height),int(self.scale*App.height)))
-        self.image=self.original
-        self.rect=self.image.get_rect()
-        
     def move(self):
-        self.rect.move_ip(tuple(self.pos-tonumpy(self.rect.center)))
+        self.rect.move_ip(tuple((self.pos-tonumpy(self.rect.center)).ravel()))
         
     def load(self,App):
-         
-        self.original=App.explosionimg[self.frame]
-        self.aspect_ratio=float(self.original.get_width())/float(self.original.get_height())
-        
-        
-        self.resize(App)
+        self.image=App.explosion_frame(self.scale,self.frame)
+        self.rect=self.image.get_rect()
         
         self.move()
         
 
 
+    def get_state(self):
+        return (1,self.pos[0,0],self.pos[1,0],self.frame,self.scale,self.time_of_frame,0,1)
+
     def update(self,App):
-        self.load(App)
-        now=time.time()
+        if not App.headless:
+            self.load(App)
+        now=App.sim_time
         if now-self.time_of_frame>=self.tpf:
             self.frame+=1
             self.time_of_frame=now
@@ -0,0 +1,138 @@
+
+# coding: utf-8
+
+# Observations built straight from the simulation state, one float32 row per
+# ship, written into the same preallocated array every step.
+# Row layout: the ship itself, the other ships in player order, then the
+# K_BULLETS nearest enemy bullets, nearest first.
+
+
+import math as m
+import numpy as np
+import main
+
+
+#OBSERVATION PARAMETERS
+K_BULLETS=4 # nearest enemy bullets per observation
+SHIP_FEATURES=10 # x, y, vx, vy, cos, sin, hp, collide, shield cooldown, reload
+BULLET_FEATURES=5 # dx, dy, vx, vy, present
+
+
+class ObservationBuilder():
+    # egocentric: other ships and bullets relative to the ship, rotated into its heading frame
+    # wrap: relative positions take the shortest way across the wrapping screen edges
+    def __init__(self,App,n_players=None,k_bullets=K_BULLETS,egocentric=True,wrap=True):
+        self.App=App
+        if n_players is None:
+            n_players=App.n_players
+        self.n_players=n_players
+        self.k_bullets=k_bullets
+        self.egocentric=egocentric
+        self.wrap=wrap
+        self.size=n_players*SHIP_FEATURES+k_bullets*BULLET_FEATURES
+        self.obs=np.zeros((n_players,self.size),dtype=np.float32)
+
+        self.bound=np.array([App.width+1.0,App.height+1.0])
+        self.unit=float(App.height) # relative distances in screen heights
+        self.rel=None
+
+    def build(self):
+        App=self.App
+        agents=[App.players[n].sprite for n in range(self.n_players)]
+        for agent in agents:
+            row=self.obs[agent.number]
+            self.ships(agent,agents,row)
+            self.bullets(agent,row[self.n_players*SHIP_FEATURES:])
+        return self.obs
+
+    def ships(self,agent,agents,row):
+        App=self.App
+        body=agent.body
+        c=m.cos(agent.angle)
+        s=m.sin(agent.angle)
+        for other in agents:
+            slot=(other.number-agent.number)%self.n_players
+            f=row[slot*SHIP_FEATURES:(slot+1)*SHIP_FEATURES]
+            o=other.body
+            if other is agent:
+                f[0]=o.x/App.width
+                f[1]=o.y/App.height
+                vx,vy=o.vx,o.vy
+                angle=other.angle
+            else:
+                dx,dy=self.displacement(o.x-body.x,o.y-body.y)
+                vx,vy=o.vx,o.vy
+                angle=other.angle
+                if self.egocentric:
+                    dx,dy=dx*c-dy*s,dx*s+dy*c
+                    vx,vy=vx-body.vx,vy-body.vy
+                    angle=other.angle-agent.angle
+                f[0]=dx/self.unit
+                f[1]=dy/self.unit
+            if self.egocentric:
+                vx,vy=vx*c-vy*s,vx*s+vy*c
+            f[2]=vx/other.MAX_SPEED
+            f[3]=vy/other.MAX_SPEED
+            f[4]=m.cos(angle)
+            f[5]=m.sin(angle)
+            f[6]=other.hp/main.HP
+            f[7]=other.collide
+            f[8]=max(main.INIT_COOLDOWN-(App.sim_time-App.t0),main.COOLDOWN-(App.sim_time-other.collisiontime),0.0)/main.INIT_COOLDOWN
+            f[9]=max(1./main.RATE_OF_FIRE-(App.sim_time-other.last_fire),0.0)*main.RATE_OF_FIRE
+
+    def displacement(self,dx,dy):
+        if self.wrap:
+            dx-=self.bound[0]*round(dx/self.bound[0])
+            dy-=self.bound[1]*round(dy/self.bound[1])
+        return dx,dy
+
+    def bullets(self,agent,out):
+        pool=self.App.bulletpool
+        if self.rel is None:
+            self.rel=np.empty((pool.capacity,2))
+            self.rel_x=self.rel[:,0]
+            self.rel_y=self.rel[:,1]
+            self.laps=np.empty((pool.capacity,2))
+            self.dist=np.empty(pool.capacity)
+            self.ignore=np.empty(pool.capacity,dtype=bool)
+            self.dead=np.empty(pool.capacity,dtype=bool)
+            self.origin=np.empty(2)
+        rel=self.rel
+        dist=self.dist
+        body=agent.body
+
+        self.origin[0]=body.x
+        self.origin[1]=body.y
+        np.subtract(pool.pos,self.origin,out=rel)
+        if self.wrap:
+            np.divide(rel,self.bound,out=self.laps)
+            np.round(self.laps,out=self.laps)
+            np.multiply(self.laps,self.bound,out=self.laps)
+            np.subtract(rel,self.laps,out=rel)
+        np.hypot(self.rel_x,self.rel_y,out=dist)
+        np.equal(pool.owner,agent.number,out=self.ignore)
+        np.logical_not(pool.alive,out=self.dead)
+        np.logical_or(self.ignore,self.dead,out=self.ignore)
+        np.copyto(dist,np.inf,where=self.ignore)
+
+        out[:]=0
+        c=m.cos(agent.angle)
+        s=m.sin(agent.angle)
+        # k is small: take the nearest remaining bullet k times instead of sorting
+        for i in range(min(self.k_bullets,pool.capacity)):
+            n=int(np.argmin(dist))
+            if not m.isfinite(dist[n]):
+                break
+            dist[n]=np.inf
+            dx,dy=self.rel_x[n],self.rel_y[n]
+            vx,vy=pool.vel[n,0],pool.vel[n,1]
+            if self.egocentric:
+                vx,vy=vx-body.vx,vy-body.vy
+                dx,dy=dx*c-dy*s,dx*s+dy*c
+                vx,vy=vx*c-vy*s,vx*s+vy*c
+            f=out[i*BULLET_FEATURES:(i+1)*BULLET_FEATURES]
+            f[0]=dx/self.unit
+            f[1]=dy/self.unit
+            f[2]=vx/agent.MAX_SPEED
+            f[3]=vy/agent.MAX_SPEED
+            f[4]=1.0
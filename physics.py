@@ -0,0 +1,118 @@
+
+# coding: utf-8
+
+# Ship and bullet physics shared by App and batch.BatchSim.
+# The scalar kernels advance one ship by one tick, launch one bullet with its
+# recoil and bounce two bodies off each other. integrate and launch_all apply
+# them to flat arrays of ships, and sweep finds bodies that met during a tick.
+# With numba installed every kernel is compiled and the array kernels loop
+# over the scalar ones. Without it, the scalar kernels run as plain Python
+# and the array kernels as NumPy expressions (integrate_numpy, launch_all_numpy,
+# always defined). Both versions do the same floating point operations in the
+# same order, python check.py verifies that the results are identical.
+
+
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba=None
+
+
+JIT=numba is not None
+
+
+def jit(fn):
+    if numba is None:
+        return fn
+    return numba.njit(cache=True)(fn)
+
+
+@jit
+def advance(x,y,vx,vy,angle,rot,thrust,dt,max_speed,drag_time,w,h):
+    # one tick of turning, thrust against drag, the |vx|+|vy| speed clamp and the
+    # wrap at w, h. Returns x, y, vx, vy, angle
+    angle+=dt*rot*2*math.pi
+    cos=math.cos(angle)
+    sin=-math.sin(angle)
+    vx+=dt*(cos*thrust-vx/drag_time)
+    vy+=dt*(sin*thrust-vy/drag_time)
+    speed=abs(vx)+abs(vy)
+    if speed>max_speed:
+        vx=vx/speed*max_speed
+        vy=vy/speed*max_speed
+    x+=dt*vx
+    y+=dt*vy
+    return x%w,y%h,vx,vy,angle
+
+
+@jit
+def launch(vx,vy,angle,speed,mass_ratio):
+    # velocity of a bullet fired at angle from a ship moving at vx, vy, and the
+    # ship's velocity after the recoil. Returns bvx, bvy, vx, vy
+    bvx=vx+math.cos(angle)*speed
+    bvy=vy+-math.sin(angle)*speed
+    return bvx,bvy,vx-mass_ratio*bvx,vy-mass_ratio*bvy
+
+
+@jit
+def bounce(x1,y1,v1x,v1y,m1,x2,y2,v2x,v2y,m2,loss):
+    # elastic collision along the line between the centres, both velocities
+    # scaled by loss afterwards. Returns v1x, v1y, v2x, v2y
+    dx=x1-x2
+    dy=y1-y2
+    d2=dx*dx+dy*dy
+    u1=((2*m2/(m1+m2))*(((v1x-v2x)*dx+(v1y-v2y)*dy)/d2))
+    u2=((2*m1/(m1+m2))*(((v2x-v1x)*-dx+(v2y-v1y)*-dy)/d2))
+    return (v1x-u1*dx)*loss,(v1y-u1*dy)*loss,(v2x-u2*-dx)*loss,(v2y-u2*-dy)*loss
+
+
+def integrate_numpy(pos,vel,angle,rot,thrust,dt,max_speed,drag_time,bound):
+    # advance for every ship, in place. pos, vel: (n, 2), the others (n,)
+    angle+=dt*rot*2*math.pi
+    heading=np.stack((np.cos(angle),-np.sin(angle)),axis=-1)
+    vel+=dt*(heading*thrust[:,None]-vel/drag_time)
+    speed=np.abs(vel[:,0])+np.abs(vel[:,1])
+    over=speed>max_speed
+    vel[over]=vel[over]/speed[over,None]*max_speed
+    pos+=dt*vel
+    np.remainder(pos,bound,out=pos)
+
+
+def launch_all_numpy(vel,angle,speed,mass_ratio):
+    # launch for every ship, returns the (n, 2) bullet and ship velocities
+    bullet_vel=vel+np.stack((np.cos(angle),-np.sin(angle)),axis=-1)*speed
+    return bullet_vel,vel-mass_ratio*bullet_vel
+
+
+# the NumPy kernels stay available with numba installed, check.py compares both
+integrate=integrate_numpy
+launch_all=launch_all_numpy
+
+if numba is not None:
+    @jit
+    def integrate(pos,vel,angle,rot,thrust,dt,max_speed,drag_time,bound):
+        for n in range(len(angle)):
+            pos[n,0],pos[n,1],vel[n,0],vel[n,1],angle[n]=advance(pos[n,0],pos[n,1],vel[n,0],vel[n,1],angle[n],rot[n],thrust[n],
+                                                                 dt,max_speed,drag_time,bound[0],bound[1])
+
+    @jit
+    def launch_all(vel,angle,speed,mass_ratio):
+        bullet_vel=np.empty_like(vel)
+        ship_vel=np.empty_like(vel)
+        for n in range(len(angle)):
+            bullet_vel[n,0],bullet_vel[n,1],ship_vel[n,0],ship_vel[n,1]=launch(vel[n,0],vel[n,1],angle[n],speed,mass_ratio)
+        return bullet_vel,ship_vel
+
+
+def sweep(rel,motion,radius):
+    # rel: (..., 2) offsets between two bodies at the end of a tick, motion: (..., 2) how
+    # much rel changed during it. True where the offset was within radius at some point
+    # of the tick. Plain NumPy in both modes
+    mm=(motion*motion).sum(axis=-1)
+    # closest point of the straight path from rel-motion to rel
+    u=np.clip((rel*motion).sum(axis=-1)/np.where(mm>0,mm,1.0),0.0,1.0)
+    closest=rel-u[...,None]*motion
+    return (closest*closest).sum(axis=-1)<=radius*radius
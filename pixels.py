@@ -0,0 +1,114 @@
+
+# coding: utf-8
+
+# Low resolution grayscale frames for pixel based policies.
+# PixelRenderer draws ships and bullets straight into a small surface with
+# sprites scaled down once and rotated through App.rotcache, so no full size
+# frame is ever rendered or downscaled. FrameStack keeps the last frames in a
+# preallocated ring buffer and hands them out as a view, oldest first.
+
+
+import numpy as np
+import pygame
+import main
+
+
+#PIXEL PARAMETERS
+PIXEL_W=84
+PIXEL_H=84
+STACK=4 # frames per observation
+
+
+class PixelRenderer():
+    def __init__(self,App,w=PIXEL_W,h=PIXEL_H):
+        self.App=App
+        self.size=self.width,self.height=w,h
+        self.sx=w/App.width
+        self.sy=h/App.height
+        self.surface=pygame.Surface(self.size,depth=32)
+        self.loaded=False
+
+    def load(self):
+        # grayscale sprites at target scale, registered once per target height
+        App=self.App
+        for n in range(App.n_players):
+            self.add(('ship',n,self.height),App.playerimg[n],main.SHIP_SIZE_R)
+            self.add(('shield',n,self.height),App.playerimg_shield[n],main.SHIELD_IMG_R*main.SHIP_SIZE_R)
+        self.add(('bullet',self.height),App.bulletimg,main.BULLET_SIZE_R)
+        self.loaded=True
+
+    def add(self,key,image,scale):
+        aspect_ratio=float(image.get_width())/float(image.get_height())
+        h=max(1,int(round(scale*self.height)))
+        w=max(1,int(round(aspect_ratio*h)))
+        self.App.rotcache.add(key,pygame.transform.grayscale(pygame.transform.smoothscale(image,(w,h))))
+
+    def blit(self,key,angle,x,y):
+        image=self.App.rotcache.get(key,angle)[0]
+        self.surface.blit(image,image.get_rect(center=(int(x*self.sx),int(y*self.sy))))
+
+    def draw(self,out):
+        # renders the current state and writes it into out, a (h, w) uint8 array
+        if not self.loaded:
+            self.load()
+        App=self.App
+        self.surface.fill(main.BLACK)
+        pool=App.bulletpool
+        for n in np.flatnonzero(pool.alive):
+            self.blit(('bullet',self.height),pool.angle[n],pool.pos[n,0],pool.pos[n,1])
+        for agent in App.agents:
+            if agent.collide:
+                key=('ship',agent.number,self.height)
+            else:
+                key=('shield',agent.number,self.height)
+            self.blit(key,agent.angle,agent.body.x,agent.body.y)
+        # the sprites are gray, so the red channel is the frame
+        view=pygame.surfarray.pixels_red(self.surface)
+        out[...]=view.T
+        del view
+        return out
+
+
+class FrameStack():
+    # every frame is stored twice, k apart, so the last k frames are always contiguous
+    def __init__(self,k=STACK,shape=(PIXEL_H,PIXEL_W),dtype=np.uint8):
+        self.k=k
+        self.buffer=np.zeros((2*k,)+tuple(shape),dtype=dtype)
+        self.n=0
+        self.empty=True
+
+    def clear(self):
+        self.empty=True
+
+    def slot(self):
+        # where the next frame is written before push
+        return self.buffer[self.n]
+
+    def push(self):
+        frame=self.buffer[self.n]
+        if self.empty:
+            self.buffer[:]=frame
+            self.empty=False
+        else:
+            self.buffer[self.n+self.k]=frame
+        self.n=(self.n+1)%self.k
+        return self.get()
+
+    def get(self):
+        return self.buffer[self.n:self.n+self.k]
+
+
+class PixelObservation():
+    # pixel counterpart of ObservationBuilder, one stack of frames shared by every player
+    def __init__(self,App,w=PIXEL_W,h=PIXEL_H,stack=STACK):
+        self.renderer=PixelRenderer(App,w,h)
+        self.frames=FrameStack(stack,(h,w))
+        self.obs=self.frames.get()
+
+    def reset(self):
+        self.frames.clear()
+
+    def build(self):
+        self.renderer.draw(self.frames.slot())
+        self.obs=self.frames.push()
+        return self.obs
@@ -0,0 +1,124 @@
+
+# coding: utf-8
+
+# Trajectory recorder for offline training data.
+# Every tick stores the observation the actions were taken from and, for every
+# player, the action, the reward and the done flag. Rows are gathered in
+# preallocated chunks, and full chunks are written by a background thread as
+# one .npy file per field, so recording never waits on the disk:
+#   shard_00000_obs.npy     (rows,)+observation shape, observation dtype
+#   shard_00000_action.npy  (rows, players, 3) int8
+#   shard_00000_reward.npy  (rows, players) float32
+#   shard_00000_done.npy    (rows, players) bool
+# load() memory-maps the shards back.
+
+
+import os
+import glob
+import queue
+import threading
+import numpy as np
+
+
+SHARD_ROWS=4096 # ticks per shard
+FIELDS=('obs','action','reward','done')
+
+
+class Chunk():
+    def __init__(self,rows,n_players,obs_shape,obs_dtype,action_size):
+        self.obs=np.zeros((rows,)+tuple(obs_shape),dtype=obs_dtype)
+        self.action=np.zeros((rows,n_players,action_size),dtype=np.int8)
+        self.reward=np.zeros((rows,n_players),dtype=np.float32)
+        self.done=np.zeros((rows,n_players),dtype=np.bool_)
+        self.n=0
+
+
+class TrajectoryRecorder():
+    def __init__(self,directory,n_players,obs_shape,obs_dtype=np.float32,action_size=3,rows=SHARD_ROWS):
+        self.directory=directory
+        os.makedirs(directory,exist_ok=True)
+        self.shape=(rows,n_players,tuple(obs_shape),np.dtype(obs_dtype),action_size)
+        found=shards(directory)
+        self.shard=found[-1]+1 if found else 0
+        self.error=None
+
+        # chunks go back to free once written, a new one is allocated only if the writer falls behind
+        self.free=queue.SimpleQueue()
+        self.full=queue.Queue()
+        self.chunk=Chunk(*self.shape)
+        self.thread=threading.Thread(target=self.write,daemon=True)
+        self.thread.start()
+        self.closed=False
+
+    def observe(self,obs):
+        # the observation the next actions are taken from
+        self.chunk.obs[self.chunk.n]=obs
+
+    def act(self,actions,rewards,dones):
+        chunk=self.chunk
+        chunk.action[chunk.n]=actions
+        chunk.reward[chunk.n]=rewards
+        chunk.done[chunk.n]=dones
+        chunk.n+=1
+        if chunk.n==len(chunk.done):
+            self.flush()
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        if self.chunk.n==0:
+            return
+        self.full.put((self.shard,self.chunk))
+        self.shard+=1
+        try:
+            self.chunk=self.free.get_nowait()
+        except queue.Empty:
+            self.chunk=Chunk(*self.shape)
+
+    def write(self):
+        while True:
+            item=self.full.get()
+            if item is None:
+                break
+            shard,chunk=item
+            try:
+                for field in FIELDS:
+                    path=shard_path(self.directory,shard,field)
+                    # written under a temporary name so load never sees half a file
+                    with open(path+'.tmp','wb') as f:
+                        np.save(f,getattr(chunk,field)[:chunk.n])
+                    os.replace(path+'.tmp',path)
+            except Exception as e:
+                self.error=e
+            chunk.n=0
+            self.free.put(chunk)
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.full.put(None)
+        self.thread.join()
+        self.closed=True
+        if self.error is not None:
+            raise self.error
+
+
+def shard_path(directory,shard,field):
+    return os.path.join(directory,'shard_{:05d}_{}.npy'.format(shard,field))
+
+
+def shards(directory):
+    # complete shards, in order
+    found=[]
+    for path in sorted(glob.glob(os.path.join(directory,'shard_*_done.npy'))):
+        shard=int(os.path.basename(path).split('_')[1])
+        if all(os.path.isfile(shard_path(directory,shard,field)) for field in FIELDS):
+            found.append(shard)
+    return found
+
+
+def load(directory):
+    # one dict of read-only memory-mapped arrays per shard
+    return [{field:np.load(shard_path(directory,shard,field),mmap_mode='r') for field in FIELDS}
+            for shard in shards(directory)]
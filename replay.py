@@ -0,0 +1,121 @@
+
+# coding: utf-8
+
+# Replays stored as the match seed plus one (rot, thrust, fire) int8 row per
+# player per tick. With the same seed, size, frame rate, rotation buckets,
+# number of players and collision mode the simulation repeats bit for bit, so
+# a match can be watched again through the normal App loop or fast-forwarded
+# headless to any tick.
+# Usage: python replay.py file.npz [tick]
+
+
+import sys
+import numpy as np
+import main
+import env
+
+
+class Replay():
+    def __init__(self,seed,size,frames,rot_buckets=main.ROT_BUCKETS,actions=None,final=None,players=main.MAX_PLAYERS,swept=main.SWEPT):
+        self.seed=seed
+        self.size=tuple(size)
+        self.frames=frames
+        self.rot_buckets=rot_buckets
+        if actions is None:
+            actions=np.zeros((0,players,env.ACTION_SIZE),dtype=np.int8)
+        self.actions=actions # (ticks, players, 3)
+        self.final=final # ship states after the last tick, see ships
+        self.swept=swept
+
+    def __len__(self):
+        return len(self.actions)
+
+    def save(self,path):
+        fields=dict(seed=np.uint64(self.seed),size=np.array(self.size),frames=self.frames,
+                    rot_buckets=self.rot_buckets,actions=self.actions,swept=self.swept)
+        if self.final is not None:
+            fields['final']=self.final
+        np.savez_compressed(path,**fields)
+
+    def app(self,headless=True):
+        return main.App(self.size[0],self.size[1],self.frames,headless=headless,rot_buckets=self.rot_buckets,seed=self.seed,
+                        n_players=self.actions.shape[1],swept=self.swept)
+
+
+def load(path):
+    with np.load(path) as data:
+        return Replay(int(data['seed']),data['size'],int(data['frames']),int(data['rot_buckets']),data['actions'],
+                      data['final'] if 'final' in data else None,swept=bool(data['swept']) if 'swept' in data else False)
+
+
+def ships(App):
+    # (players, 5) rows of x, y, vx, vy, angle, enough to spot a diverging replay
+    agents=[App.players[n].sprite for n in range(App.n_players)]
+    return np.array([[a.body.x,a.body.y,a.body.vx,a.body.vy,a.angle] for a in agents])
+
+
+class Recorder():
+    # tick hook storing the actions every ship is about to play, from the start of a match
+    def __init__(self,App,capacity=4096):
+        self.App=App
+        self.seed=App.seed
+        self.actions=np.zeros((capacity,App.n_players,env.ACTION_SIZE),dtype=np.int8)
+        self.ticks=0
+        App.tick_hooks.append(self)
+
+    def __call__(self,App):
+        if self.ticks==len(self.actions):
+            self.actions=np.concatenate((self.actions,np.zeros_like(self.actions)))
+        for agent in App.agents:
+            self.actions[self.ticks,agent.number]=agent.action
+        self.ticks+=1
+
+    def stop(self):
+        if self in self.App.tick_hooks:
+            self.App.tick_hooks.remove(self)
+        App=self.App
+        return Replay(self.seed,App.size,App.fps,App.rotcache.buckets,self.actions[:self.ticks].copy(),ships(App),swept=App.swept)
+
+
+class Player():
+    # tick hook overriding every ship's action with the recorded one
+    def __init__(self,replay,App):
+        self.replay=replay
+        self.tick=0
+        App.tick_hooks.append(self)
+
+    def __call__(self,App):
+        if self.tick>=len(self.replay):
+            App.running=False
+            return
+        for agent in App.agents:
+            agent.set_action(*self.replay.actions[self.tick,agent.number])
+        self.tick+=1
+
+
+def play(replay):
+    # watch a replay in a window at the recorded frame rate
+    App=replay.app(headless=False)
+    Player(replay,App)
+    App.on_execute(len(replay))
+
+
+def fast_forward(replay,tick=None):
+    # headless at full speed up to tick, or to the end. Returns the App to inspect
+    if tick is None:
+        tick=len(replay)
+    App=replay.app()
+    App.on_init()
+    Player(replay,App)
+    for n in range(tick):
+        App.on_loop()
+    return App
+
+
+if __name__ == "__main__" :
+    replay=load(sys.argv[1])
+    if len(sys.argv)>2:
+        App=fast_forward(replay,int(sys.argv[2]))
+        print(ships(App))
+    else:
+        play(replay)
@@ -0,0 +1,130 @@
+
+# coding: utf-8
+
+# Runs K headless SpaceOutEnv matches in worker processes.
+# Actions, observations, rewards and dones live in shared memory. The pipes
+# only carry short commands, so nothing is pickled per step. The arrays
+# returned by reset and step are those shared buffers, overwritten every step.
+# Finished matches are reset by their worker, and the observation written for
+# them is the first one of the next match; the last one of the finished match
+# is in info['terminal_observation']. With record set, every worker
+# writes its trajectory shards to its own subdirectory. With seed set, every
+# worker derives its own seed from it.
+
+
+import os
+import multiprocessing as mp
+import numpy as np
+import env
+
+
+def shared(ctx,dtype,shape):
+    dtype=np.dtype(dtype)
+    raw=ctx.RawArray('b',int(np.prod(shape))*dtype.itemsize)
+    return raw,np.frombuffer(raw,dtype=dtype).reshape(shape)
+
+
+def worker(i,pipe,buffers,env_kwargs):
+    actions,obs,rewards,dones=[np.frombuffer(raw,dtype=dtype).reshape(shape) for raw,dtype,shape in buffers]
+    if env_kwargs.get('record') is not None:
+        env_kwargs=dict(env_kwargs,record=os.path.join(env_kwargs['record'],'worker_{:02d}'.format(i)))
+    if env_kwargs.get('seed') is not None:
+        # the i-th child of the given seed, so workers play different matches
+        stream=np.random.default_rng(np.random.SeedSequence(env_kwargs['seed'],spawn_key=(i,)))
+        env_kwargs=dict(env_kwargs,seed=int(stream.integers(2**63)))
+    e=env.SpaceOutEnv(**env_kwargs)
+    try:
+        while True:
+            cmd=pipe.recv()
+            if cmd=='step':
+                o,r,d,info=e.step(actions[i])
+                if d.any():
+                    # the last observation of the match, needed to bootstrap a truncated one
+                    info['terminal_observation']=o.copy()
+                    o=e.reset()
+                obs[i]=o
+                rewards[i]=r
+                dones[i]=d
+                pipe.send(info)
+            elif cmd=='reset':
+                obs[i]=e.reset()
+                pipe.send(None)
+            elif cmd=='close':
+                break
+    finally:
+        e.close()
+        pipe.close()
+
+
+class SubprocVecEnv():
+    def __init__(self,k,context=None,**env_kwargs):
+        self.k=k
+        env_kwargs['headless']=True
+        probe=env.SpaceOutEnv(**dict(env_kwargs,record=None))
+        self.n_players=probe.n_players
+        self.obs_shape=probe.obs.shape
+        self.obs_dtype=probe.obs.dtype
+        ctx=mp.get_context(context)
+
+        specs=[(np.int8,(k,self.n_players,env.ACTION_SIZE)),
+               (self.obs_dtype,(k,)+self.obs_shape),
+               (np.float32,(k,self.n_players)),
+               (np.bool_,(k,self.n_players))]
+        raws=[]
+        views=[]
+        for dtype,shape in specs:
+            raw,view=shared(ctx,dtype,shape)
+            raws.append((raw,dtype,shape))
+            views.append(view)
+        self.actions,self.obs,self.rewards,self.dones=views
+
+        self.pipes=[]
+        self.processes=[]
+        for i in range(k):
+            parent,child=ctx.Pipe()
+            p=ctx.Process(target=worker,args=(i,child,raws,env_kwargs),daemon=True)
+            p.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(p)
+        self.waiting=False
+        self.closed=False
+
+    def reset(self):
+        for pipe in self.pipes:
+            pipe.send('reset')
+        for pipe in self.pipes:
+            pipe.recv()
+        return self.obs
+
+    def step_async(self,actions):
+        self.actions[...]=actions
+        for pipe in self.pipes:
+            pipe.send('step')
+        self.waiting=True
+
+    def step_wait(self):
+        infos=[pipe.recv() for pipe in self.pipes]
+        self.waiting=False
+        return self.obs,self.rewards,self.dones,infos
+
+    def step(self,actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.step_wait()
+        for pipe in self.pipes:
+            pipe.send('close')
+        for p in self.processes:
+            p.join()
+        self.closed=True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type, exc_value, traceback):
+        self.close()